@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark comparing the device list parsing paths on a large synthetic payload:
+building a new list of dictionaries for every poll (previous path) vs. updating the slotted
+device records in the registry in place (current path)
+
+Usage: python benchmarks/bench_device_records.py [gateways] [openers per gateway] [lamps per gateway]
+"""
+
+import os
+import sys
+import timeit
+import tracemalloc
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import myqapi
+
+# quiet the module level logger configured by the MyQ API
+logging.getLogger().setLevel(logging.WARNING)
+
+_ITERATIONS = 200
+
+# build the items of a device list response for a synthetic account
+def buildItems(gateways, openers, lamps):
+
+    items = []
+    for g in range(gateways):
+        gatewayID = "GW{:010d}".format(g)
+        items.append({
+            "serial_number": gatewayID,
+            "device_family": myqapi.API_DEVICE_TYPE_GATEWAY,
+            "name": "Gateway {}".format(g),
+            "state": {"online": True, "last_status": "2021-10-05T12:00:00.0000000Z"}
+        })
+        for o in range(openers):
+            items.append({
+                "serial_number": "CG{:06d}{:04d}".format(g, o),
+                "device_family": myqapi.API_DEVICE_TYPE_OPENER,
+                "parent_device_id": gatewayID,
+                "name": "Door {}-{}".format(g, o),
+                "state": {"door_state": "closed", "last_update": "2021-10-05T11:00:00.0000000Z", "last_status": "2021-10-05T12:00:00.0000000Z"}
+            })
+        for l in range(lamps):
+            items.append({
+                "serial_number": "LM{:06d}{:04d}".format(g, l),
+                "device_family": myqapi.API_DEVICE_TYPE_LAMP,
+                "parent_device_id": gatewayID,
+                "name": "Lamp {}-{}".format(g, l),
+                "state": {"lamp_state": "off", "last_update": "2021-10-05T11:00:00.0000000Z", "last_status": "2021-10-05T12:00:00.0000000Z"}
+            })
+
+    return items
+
+# previous path - build a new list of dictionaries for each poll
+def parseToDicts(items):
+
+    deviceList = []
+    for dev in items:
+        deviceID = dev["serial_number"]
+        deviceType = dev["device_family"]
+        description = dev.get("name", deviceType + " " + deviceID[-4:])
+        if deviceType == myqapi.API_DEVICE_TYPE_GATEWAY:
+            deviceList.append({
+                "type": deviceType,
+                "id": deviceID,
+                "description": description,
+                "online": dev["state"]["online"],
+                "last_updated": dev["state"]["last_status"]
+            })
+        elif deviceType in (myqapi.API_DEVICE_TYPE_OPENER, myqapi.API_DEVICE_TYPE_LAMP):
+            deviceList.append({
+                "type": deviceType,
+                "id": deviceID,
+                "parent_id": dev["parent_device_id"],
+                "description": description,
+                "state": dev["state"]["door_state" if deviceType == myqapi.API_DEVICE_TYPE_OPENER else "lamp_state"],
+                "last_changed": dev["state"]["last_update"],
+                "last_updated": dev["state"]["last_status"]
+            })
+
+    return deviceList
+
+# measure the time per poll and the peak memory allocated during a poll
+def measure(func, items):
+
+    secs = timeit.timeit(lambda: func(items), number=_ITERATIONS) / _ITERATIONS
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    result = func(items)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return secs, peak, result
+
+def main():
+
+    gateways, openers, lamps = (int(arg) for arg in (sys.argv[1:] + ["50", "4", "2"][len(sys.argv) - 1:])[:3])
+    items = buildItems(gateways, openers, lamps)
+
+    registry = myqapi._DeviceRegistry()
+    registry.updateDevices(items) # initial poll creates the records
+
+    print("Device list of {} devices ({} iterations):".format(len(items), _ITERATIONS))
+    for label, func in (("dicts", parseToDicts), ("records", registry.updateDevices)):
+        secs, peak, _ = measure(func, items)
+        print("  {:<8} {:8.1f} us per poll  {:10d} bytes allocated per poll".format(label, secs * 1000000, peak))
+
+if __name__ == "__main__":
+    main()
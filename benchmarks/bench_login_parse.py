@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""
+Benchmarks for parsing the MyQ login page: import time and resident memory (Linux) of
+the HTML parsing modules, and time to extract the verification token from the login form
+with the stdlib HTML parser vs. PyQuery (if installed)
+
+Usage: python benchmarks/bench_login_parse.py [iterations]
+"""
+
+import os
+import sys
+import json
+import timeit
+import statistics
+import subprocess
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import myqapi
+
+# quiet the module level logger configured by the MyQ API
+logging.getLogger().setLevel(logging.WARNING)
+
+_IMPORT_RUNS = 5
+
+# code run in a fresh interpreter to measure import time and the resulting resident memory
+_IMPORT_PROBE = """
+import time, json
+start = time.perf_counter()
+{}
+elapsed = time.perf_counter() - start
+rss = 0
+with open("/proc/self/status") as f:
+    for line in f:
+        if line.startswith("VmRSS:"):
+            rss = int(line.split()[1])
+print(json.dumps({{"secs": elapsed, "rss_kb": rss}}))
+"""
+
+# build a synthetic login page roughly the size and shape of the MyQ login page
+def buildLoginPage():
+
+    head = "<!DOCTYPE html><html><head><title>MyQ</title>" + "<link rel=\"stylesheet\" href=\"/css/site{}.css\" />".format("") * 20 + "<script>var x = 1 &amp;&amp; 2;</script></head><body>"
+    filler = "<div class=\"row\"><div class=\"col\"><span>Sign in to your account &amp; manage devices</span></div></div>" * 120
+    form = (
+        "<form method=\"post\" action=\"/Account/Login\">"
+        "<input type=\"email\" name=\"Email\" /><input type=\"password\" name=\"Password\" />"
+        "<button type=\"submit\">Sign In</button>"
+        "<input name=\"__RequestVerificationToken\" type=\"hidden\" value=\"CfDJ8BqZ1_Q2hMZzW0aV6uRbNx0Yt3kKq8n\" />"
+        "</form>"
+    )
+    footer = "<footer>" + "<p>&copy; The Chamberlain Group</p>" * 200 + "</footer></body></html>"
+
+    return head + filler + form + footer
+
+# measure the import time and resident memory of the import statement in a fresh interpreter
+def measureImport(statement):
+
+    results = []
+    for _ in range(_IMPORT_RUNS):
+        out = subprocess.run([sys.executable, "-c", _IMPORT_PROBE.format(statement)], capture_output=True, text=True)
+        if out.returncode != 0:
+            return None
+        results.append(json.loads(out.stdout))
+
+    return statistics.median(r["secs"] for r in results), statistics.median(r["rss_kb"] for r in results)
+
+def main():
+
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    html = buildLoginPage()
+
+    try:
+        from pyquery import PyQuery
+    except ImportError:
+        PyQuery = None
+
+    print("Import time (median of {} runs in a fresh interpreter):".format(_IMPORT_RUNS))
+    for label, statement in (("baseline", "pass"), ("html.parser", "from html.parser import HTMLParser"), ("pyquery", "from pyquery import PyQuery")):
+        result = measureImport(statement)
+        if result is None:
+            print("  {:<12} not installed".format(label))
+        else:
+            print("  {:<12} {:8.2f} ms  RSS {:8.0f} KB".format(label, result[0] * 1000, result[1]))
+
+    print("Login page parse ({} bytes, {} iterations):".format(len(html), iterations))
+
+    secs = timeit.timeit(lambda: myqapi._getInputValue(html, "__RequestVerificationToken"), number=iterations)
+    print("  {:<12} {:8.3f} ms per parse".format("html.parser", secs / iterations * 1000))
+
+    if PyQuery is None:
+        print("  {:<12} not installed".format("pyquery"))
+    else:
+        secs = timeit.timeit(lambda: PyQuery(html)("input[name='__RequestVerificationToken']").attr("value"), number=iterations)
+        print("  {:<12} {:8.3f} ms per parse".format("pyquery", secs / iterations * 1000))
+
+if __name__ == "__main__":
+    main()
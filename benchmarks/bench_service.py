@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+"""
+Latency and throughput benchmarks of the login, poll, and command paths of the MyQ API wrapper
+against the local stand-in for the MyQ cloud service (see fakemyq.py)
+
+Usage: python benchmarks/bench_service.py [--iterations N] [--latency SECS] [--homes N] [--async] [--rate-limit] ...
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import threading
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import myqapi
+import fakemyq
+
+# quiet the module level logger configured by the MyQ API
+logging.getLogger().setLevel(logging.WARNING)
+
+# create a connection to the fake service
+def connect(server, asyncClient):
+    if asyncClient:
+        return myqapi.AsyncMyQBridge(baseURLs=server.baseURLs)
+    else:
+        return myqapi.MyQ(baseURLs=server.baseURLs)
+
+# time each call of the function and return the durations in milliseconds
+def timeCalls(func, iterations):
+
+    durations = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        func(i)
+        durations.append((time.perf_counter() - start) * 1000)
+
+    return durations
+
+# print the latency percentiles of the durations
+def report(label, durations):
+    durations = sorted(durations)
+    p95 = durations[min(int(len(durations) * 0.95), len(durations) - 1)]
+    print("{:<28} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.2f}".format(label, statistics.mean(durations), durations[len(durations) // 2], p95, durations[-1]))
+
+# log in with a new connection, then close the connection
+def login(server, asyncClient):
+    conn = connect(server, asyncClient)
+    rc = conn.loginToService(fakemyq.FAKE_USERNAME, fakemyq.FAKE_PASSWORD, myqapi.ALL_HOMES)
+    conn.disconnect()
+    assert rc == myqapi.LOGIN_SUCCESS
+
+# poll the device list from a number of threads sharing the connection and return the polls per second
+# Note: concurrent polls share the call to the service in flight
+def pollThroughput(conn, client, threads, duration):
+
+    counts = [0] * threads
+    stop = time.perf_counter() + duration
+
+    def poller(n):
+        while time.perf_counter() < stop:
+            client._deviceListSnapshot = None
+            conn.pollDeviceList()
+            counts[n] += 1
+
+    workers = [threading.Thread(target=poller, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    return sum(counts) / duration
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark the MyQ API wrapper against the fake MyQ service")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to each API response")
+    parser.add_argument("--homes", type=int, default=1)
+    parser.add_argument("--gateways", type=int, default=1)
+    parser.add_argument("--openers", type=int, default=2)
+    parser.add_argument("--lamps", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=4, help="polling threads for the throughput test")
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds to run the throughput test")
+    parser.add_argument("--async", dest="asyncClient", action="store_true", help="use the asyncio client")
+    parser.add_argument("--rate-limit", dest="rateLimit", action="store_true", help="keep the client-side rate limit of the MyQ API wrapper")
+    args = parser.parse_args()
+
+    # lift the client-side rate limit so that the calls themselves are measured
+    if not args.rateLimit:
+        myqapi._RATE_LIMIT_MAX_RATE = 1e9
+        myqapi._RATE_LIMIT_BURST = 1e9
+
+    server = fakemyq.FakeMyQServer(
+        homes=args.homes, gateways=args.gateways, openers=args.openers, lamps=args.lamps,
+        latency=args.latency, doorTravelTime=0
+    ).start()
+
+    conn = connect(server, args.asyncClient)
+    conn.loginToService(fakemyq.FAKE_USERNAME, fakemyq.FAKE_PASSWORD, myqapi.ALL_HOMES)
+    devices = conn.getDeviceList()
+    doors = [device.id for device in devices if device.type == myqapi.API_DEVICE_TYPE_OPENER]
+
+    print("{} client, {} devices in {} home(s), {} ms added latency, {} iterations".format(
+        "Async" if args.asyncClient else "Sync", len(devices), args.homes, args.latency * 1000, args.iterations))
+    print()
+    print("{:<28} {:>9} {:>9} {:>9} {:>9}".format("Latency (ms)", "mean", "p50", "p95", "max"))
+
+    report("login", timeCalls(lambda i: login(server, args.asyncClient), max(args.iterations // 5, 1)))
+
+    # a changed device list is parsed on every poll, an unchanged one is answered with 304 Not Modified,
+    # and a device list retrieved within the cache TTL is served without a call to the service
+    client = conn._conn if args.asyncClient else conn
+    def pollChanged(i):
+        client._invalidateDeviceList()
+        conn.pollDeviceList()
+
+    def pollUnchanged(i):
+        client._deviceListSnapshot = None
+        conn.pollDeviceList()
+
+    report("poll (changed)", timeCalls(pollChanged, args.iterations))
+    report("poll (unchanged)", timeCalls(pollUnchanged, args.iterations))
+    report("poll (cached)", timeCalls(lambda i: conn.pollDeviceList(), args.iterations))
+    report("get device", timeCalls(lambda i: conn.getDevice(doors[i % len(doors)]), args.iterations))
+    report("command (open/close)", timeCalls(lambda i: (conn.open if i % 2 == 0 else conn.close)(doors[0]), args.iterations))
+
+    print()
+    print("Poll throughput with {} threads: {:.1f} polls/s".format(args.threads, pollThroughput(conn, client, args.threads, args.duration)))
+
+    conn.disconnect()
+    server.stop()
@@ -0,0 +1,474 @@
+#!/usr/bin/env python
+"""
+Local stand-in for the MyQ cloud service for offline testing and benchmarking. Implements the
+oAuth login (authorize, login form, redirect, and token) flow, the accounts, device list, and
+device properties APIs, and the garage door opener and lamp actions used by the MyQ API wrapper
+on a single local HTTP server, with configurable latency, injected errors, and simulated door travel.
+
+Usage: python benchmarks/fakemyq.py [--port PORT] [--latency SECS] [--error-rate RATE] ...
+
+Point the MyQ API wrapper at the server with its base URLs, e.g.:
+
+    server = FakeMyQServer(latency=0.05).start()
+    conn = myqapi.MyQ(baseURLs=server.baseURLs)
+    conn.loginToService(FAKE_USERNAME, FAKE_PASSWORD)
+"""
+
+import sys
+import time
+import json
+import random
+import secrets
+import hashlib
+import base64
+import argparse
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, urlencode
+
+# Default credentials accepted by the fake login form
+FAKE_USERNAME = "user@example.com"
+FAKE_PASSWORD = "password"
+
+# Paths of the fake oAuth service (the authorize and token paths are the same as the MyQ service)
+_LOGIN_PATH = "/Account/Login"
+_CALLBACK_PATH = "/connect/authorize/callback"
+_AUTHORIZE_PATH = "/connect/authorize"
+_TOKEN_PATH = "/connect/token"
+_ACCOUNTS_PATH = "/api/v6.0/accounts"
+_ACCOUNT_PATH_PREFIX = "/api/v5.2/Accounts/"
+
+# Padding for the login page so that it is roughly the size of the MyQ login page
+_LOGIN_PAGE = """<!DOCTYPE html>
+<html><head><title>MyQ Login</title>{padding}</head>
+<body><form method="post" action="{action}">
+<input type="email" name="Email" />
+<input type="password" name="Password" />
+<input name="__RequestVerificationToken" type="hidden" value="{token}" />
+<button type="submit">Sign In</button>
+</form></body></html>"""
+_LOGIN_PAGE_PADDING = "<style>" + "body {margin: 0;} " * 2000 + "</style>"
+
+# return the current time formatted as a MyQ service timestamp
+def _timestamp(t=None):
+    return time.strftime("%Y-%m-%dT%H:%M:%S.0000000Z", time.gmtime(time.time() if t is None else t))
+
+# Simulated device in a fake account
+class _FakeDevice(object):
+
+    def __init__(self, serial, family, name, parentID=None, state=None):
+        self.serial = serial
+        self.family = family
+        self.name = name
+        self.parentID = parentID
+        self.state = state
+        self.lastChanged = time.time()
+        self.target = None
+        self.arrival = 0
+
+    # start the door travel or switch the lamp for the specified action
+    def act(self, action, travelTime):
+
+        now = time.time()
+        self._settle(now)
+
+        if self.family == "garagedoor":
+            target = "open" if action == "open" else "closed"
+            if self.state != target:
+                self.state = "opening" if target == "open" else "closing"
+                self.target = target
+                self.arrival = now + travelTime
+                self.lastChanged = now
+
+        else:
+            state = "on" if action == "on" else "off"
+            if self.state != state:
+                self.state = state
+                self.lastChanged = now
+
+    # complete the door travel if the door has arrived
+    def _settle(self, now):
+        if self.target is not None and now >= self.arrival:
+            self.state = self.target
+            self.target = None
+            self.lastChanged = self.arrival
+
+    # return the device item as returned from the MyQ service
+    def item(self, accountID):
+
+        self._settle(time.time())
+
+        item = {
+            "href": "{}{}/Devices/{}".format(_ACCOUNT_PATH_PREFIX, accountID, self.serial),
+            "serial_number": self.serial,
+            "device_family": self.family,
+            "device_platform": "myq",
+            "device_type": "wifigaragedooropener" if self.family == "garagedoor" else self.family,
+            "name": self.name,
+            "account_id": accountID,
+            "state": {"last_status": _timestamp()}
+        }
+
+        if self.family == "gateway":
+            item["state"]["online"] = True
+        else:
+            item["parent_device_id"] = self.parentID
+            item["state"]["last_update"] = _timestamp(self.lastChanged)
+            item["state"]["door_state" if self.family == "garagedoor" else "lamp_state"] = self.state
+            item["state"]["online"] = True
+
+        return item
+
+# Local HTTP server standing in for the MyQ cloud services
+class FakeMyQServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, homes=1, gateways=1, openers=2, lamps=1,
+                 latency=0.0, jitter=0.0, errorRate=0.0, unauthorizedRate=0.0, rateLimitRate=0.0,
+                 retryAfter=1, doorTravelTime=10.0, tokenTTL=3600, userName=FAKE_USERNAME, password=FAKE_PASSWORD):
+        """Creates the server
+
+        Parameters:
+        host, port -- address to listen on (port 0 picks a free port)
+        homes, gateways, openers, lamps -- number of homes (accounts), gateways per home, and openers and lamps per gateway
+        latency, jitter -- seconds added to each API response, plus a random amount of up to jitter seconds
+        errorRate -- fraction of API calls answered with 503 Service Unavailable
+        unauthorizedRate -- fraction of API calls answered with 401 Unauthorized
+        rateLimitRate -- fraction of API calls answered with 429 Too Many Requests (with Retry-After header)
+        retryAfter -- seconds returned in the Retry-After header of 429 responses
+        doorTravelTime -- seconds for a door to open or close
+        tokenTTL -- lifetime in seconds of the access tokens issued
+        userName, password -- credentials accepted by the login form
+        """
+
+        super(FakeMyQServer, self).__init__((host, port), _FakeMyQHandler)
+
+        self.latency = latency
+        self.jitter = jitter
+        self.errorRate = errorRate
+        self.unauthorizedRate = unauthorizedRate
+        self.rateLimitRate = rateLimitRate
+        self.retryAfter = retryAfter
+        self.doorTravelTime = doorTravelTime
+        self.tokenTTL = tokenTTL
+        self.userName = userName
+        self.password = password
+        self.requestCounts = Counter()
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self._verificationTokens = set()
+        self._authCodes = {}
+        self._accessTokens = {}
+        self._refreshTokens = set()
+        self.accounts = self._buildAccounts(homes, gateways, openers, lamps)
+
+    @property
+    def baseURL(self):
+        return "http://{}:{}".format(*self.server_address[:2])
+
+    @property
+    def baseURLs(self):
+        """Returns the base URLs for each of the MyQ services (for the baseURLs parameter of the MyQ constructor)"""
+        return {service: self.baseURL for service in ("accounts", "devices", "gdo", "lamp", "oauth")}
+
+    def start(self):
+        """Starts serving requests on a background thread and returns the server"""
+        self._thread = threading.Thread(target=self.serve_forever, name="FakeMyQServer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops serving requests and closes the server socket"""
+        self.shutdown()
+        self.server_close()
+
+    def expireTokens(self):
+        """Expires all access tokens issued so far (the refresh tokens stay valid)"""
+        with self._lock:
+            self._accessTokens.clear()
+
+    # build the accounts (homes) and their devices
+    def _buildAccounts(self, homes, gateways, openers, lamps):
+
+        accounts = {}
+        for h in range(homes):
+            accountID = "{:08x}-0000-4000-8000-{:012x}".format(h + 1, h + 1)
+            devices = {}
+            for g in range(gateways):
+                gatewayID = "GW{:02d}{:08d}".format(h, g)
+                devices[gatewayID] = _FakeDevice(gatewayID, "gateway", "Gateway {}".format(g + 1))
+                for o in range(openers):
+                    serial = "CG{:02d}{:04d}{:04d}".format(h, g, o)
+                    devices[serial] = _FakeDevice(serial, "garagedoor", "Garage Door {}-{}".format(g + 1, o + 1), gatewayID, "closed")
+                for l in range(lamps):
+                    serial = "LM{:02d}{:04d}{:04d}".format(h, g, l)
+                    devices[serial] = _FakeDevice(serial, "lamp", "Lamp {}-{}".format(g + 1, l + 1), gatewayID, "off")
+            accounts[accountID] = {"name": "Home {}".format(h + 1), "devices": devices}
+
+        return accounts
+
+    # issue a new access and refresh token pair
+    def _issueTokens(self, scope):
+
+        with self._lock:
+            accessToken = secrets.token_urlsafe(32)
+            refreshToken = secrets.token_urlsafe(32)
+            self._accessTokens[accessToken] = time.time() + self.tokenTTL
+            self._refreshTokens.add(refreshToken)
+
+        return {
+            "access_token": accessToken,
+            "refresh_token": refreshToken,
+            "token_type": "Bearer",
+            "expires_in": self.tokenTTL,
+            "scope": scope
+        }
+
+    # check the access token in the authorization header of an API call
+    def _checkAccessToken(self, authorization):
+
+        tokenType, _, accessToken = (authorization or "").partition(" ")
+        with self._lock:
+            return tokenType == "Bearer" and self._accessTokens.get(accessToken, 0) > time.time()
+
+# Request handler for the fake MyQ services
+class _FakeMyQHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1" # keep connections alive like the MyQ service
+    server_version = "FakeMyQ/1.0"
+    disable_nagle_algorithm = True # headers and body are written separately
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._send(200, b"")
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    # route the request to the oAuth or API handlers
+    def _dispatch(self, method):
+
+        url = urlsplit(self.path)
+        self.query = parse_qs(url.query)
+        self.body = self.rfile.read(int(self.headers.get("Content-Length", 0) or 0))
+        self.server.requestCounts[method + " " + _pathKind(url.path)] += 1
+
+        if url.path == _AUTHORIZE_PATH and method == "GET":
+            return self._authorize()
+        elif url.path == _LOGIN_PATH:
+            return self._login() if method == "POST" else self._loginPage()
+        elif url.path == _CALLBACK_PATH and method == "GET":
+            return self._callback()
+        elif url.path == _TOKEN_PATH and method == "POST":
+            return self._token()
+
+        # API calls are delayed and subject to injected errors
+        if url.path == _ACCOUNTS_PATH or url.path.startswith(_ACCOUNT_PATH_PREFIX):
+            if not self._simulateService():
+                return
+            if not self.server._checkAccessToken(self.headers.get("Authorization")):
+                return self._sendJSON(401, {"code": "401.101", "message": "Unauthorized", "description": "The access token is invalid or has expired."})
+            if url.path == _ACCOUNTS_PATH and method == "GET":
+                return self._sendJSON(200, {"accounts": [{"id": accountID, "name": account["name"]} for accountID, account in self.server.accounts.items()]})
+            return self._account(method, url.path[len(_ACCOUNT_PATH_PREFIX):].split("/"))
+
+        self._sendJSON(404, {"code": "404.100", "message": "Not Found", "description": "Unknown path {}".format(url.path)})
+
+    # apply the configured latency and error injection - returns False if an error was sent
+    def _simulateService(self):
+
+        server = self.server
+        delay = server.latency + random.uniform(0, server.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        roll = random.random()
+        if roll < server.errorRate:
+            self._sendJSON(503, {"code": "503.100", "message": "Service Unavailable", "description": "Injected error."})
+        elif roll < server.errorRate + server.unauthorizedRate:
+            self._sendJSON(401, {"code": "401.101", "message": "Unauthorized", "description": "Injected error."})
+        elif roll < server.errorRate + server.unauthorizedRate + server.rateLimitRate:
+            self._sendJSON(429, {"code": "429.100", "message": "Too Many Requests", "description": "Injected error."}, {"Retry-After": str(server.retryAfter)})
+        else:
+            return True
+
+        return False
+
+    # oAuth step 1: redirect the authorization request to the login page
+    def _authorize(self):
+
+        if self.query.get("code_challenge_method") != ["S256"] or not self.query.get("code_challenge"):
+            return self._sendJSON(400, {"error": "invalid_request"})
+
+        returnURL = _AUTHORIZE_PATH + "/callback?" + urlencode({k: v[0] for k, v in self.query.items()})
+        self._send(302, b"", {"Location": _LOGIN_PATH + "?" + urlencode({"ReturnUrl": returnURL})})
+
+    # oAuth step 1 (continued): the login page with the verification token in the login form
+    def _loginPage(self):
+
+        token = secrets.token_urlsafe(48)
+        with self.server._lock:
+            self.server._verificationTokens.add(token)
+
+        page = _LOGIN_PAGE.format(padding=_LOGIN_PAGE_PADDING, action=self.path, token=token).encode()
+        self._send(200, page, {"Content-Type": "text/html; charset=utf-8"}, [".AspNetCore.Antiforgery=" + secrets.token_urlsafe(16) + "; path=/; httponly"])
+
+    # oAuth step 2: check the credentials and verification token and redirect to the callback
+    def _login(self):
+
+        form = parse_qs(self.body.decode())
+        with self.server._lock:
+            validToken = form.get("__RequestVerificationToken", [""])[0] in self.server._verificationTokens
+
+        # like the MyQ service, failed logins return the login page without the authentication cookies
+        if not validToken or form.get("Email", [""])[0] != self.server.userName or form.get("Password", [""])[0] != self.server.password:
+            return self._loginPage()
+
+        returnURL = parse_qs(urlsplit(self.path).query).get("ReturnUrl", [_CALLBACK_PATH])[0]
+        cookies = [
+            ".AspNetCore.Identity.Application=" + secrets.token_urlsafe(32) + "; path=/; httponly",
+            "idsrv.session=" + secrets.token_urlsafe(16) + "; path=/"
+        ]
+        self._send(302, b"", {"Location": returnURL}, cookies)
+
+    # oAuth step 3: redirect back to the MyQ app with the authorization code
+    def _callback(self):
+
+        code = secrets.token_urlsafe(32)
+        with self.server._lock:
+            self.server._authCodes[code] = self.query.get("code_challenge", [""])[0]
+
+        location = self.query.get("redirect_uri", ["com.myqops://ios"])[0] + "?" + urlencode({"code": code, "scope": self.query.get("scope", [""])[0]})
+        self._send(302, b"", {"Location": location})
+
+    # oAuth step 4 (and refresh): exchange the authorization code or refresh token for tokens
+    def _token(self):
+
+        form = parse_qs(self.body.decode())
+        grantType = form.get("grant_type", [""])[0]
+        scope = form.get("scope", ["MyQ_Residential offline_access"])[0]
+
+        if grantType == "authorization_code":
+            with self.server._lock:
+                challenge = self.server._authCodes.pop(form.get("code", [""])[0], None)
+            verifier = form.get("code_verifier", [""])[0]
+            if challenge is None or _codeChallenge(verifier) != challenge:
+                return self._sendJSON(400, {"error": "invalid_grant"})
+
+        elif grantType == "refresh_token":
+            with self.server._lock:
+                refreshToken = form.get("refresh_token", [""])[0]
+                if refreshToken not in self.server._refreshTokens:
+                    return self._sendJSON(400, {"error": "invalid_grant"})
+                self.server._refreshTokens.discard(refreshToken)
+
+        else:
+            return self._sendJSON(400, {"error": "unsupported_grant_type"})
+
+        self._sendJSON(200, self.server._issueTokens(scope))
+
+    # device list, device properties, and device actions for an account
+    def _account(self, method, parts):
+
+        account = self.server.accounts.get(parts[0])
+        if account is None or len(parts) < 2:
+            return self._sendJSON(404, {"code": "404.101", "message": "Not Found", "description": "Unknown account."})
+
+        devices = account["devices"]
+
+        # device list (with ETag for conditional requests)
+        if method == "GET" and len(parts) == 2 and parts[1] == "Devices":
+            items = [device.item(parts[0]) for device in devices.values()]
+            body = json.dumps({"href": self.path, "count": len(items), "items": items}).encode()
+            eTag = '"{}"'.format(hashlib.md5(body).hexdigest())
+            if self.headers.get("If-None-Match") == eTag:
+                return self._send(304, b"", {"ETag": eTag})
+            return self._send(200, body, {"Content-Type": "application/json", "ETag": eTag})
+
+        # device properties
+        if method == "GET" and len(parts) == 3 and parts[1] == "Devices" and parts[2] in devices:
+            return self._sendJSON(200, devices[parts[2]].item(parts[0]))
+
+        # garage door opener and lamp actions
+        if method == "PUT" and len(parts) == 4 and parts[2] in devices:
+            device = devices[parts[2]]
+            if (parts[1], device.family, parts[3]) in (("door_openers", "garagedoor", "open"), ("door_openers", "garagedoor", "close"), ("lamps", "lamp", "on"), ("lamps", "lamp", "off")):
+                with self.server._lock:
+                    device.act(parts[3], self.server.doorTravelTime)
+                return self._send(202, b"")
+
+        self._sendJSON(404, {"code": "404.102", "message": "Not Found", "description": "Unknown device or action."})
+
+    # send a JSON response
+    def _sendJSON(self, status, data, headers=None):
+        self._send(status, json.dumps(data).encode(), dict(headers or {}, **{"Content-Type": "application/json"}))
+
+    # send a response with the specified headers and cookies
+    def _send(self, status, body, headers=None, cookies=None):
+
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        for cookie in (cookies or []):
+            self.send_header("Set-Cookie", cookie)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+# return the S256 PKCE code challenge for a code verifier
+def _codeChallenge(verifier):
+    return base64.urlsafe_b64encode(hashlib.sha256(verifier.encode()).digest()).decode().rstrip("=")
+
+# return the kind of request for the request counts, e.g., "Devices" or "door_openers"
+def _pathKind(path):
+
+    if path.startswith(_ACCOUNT_PATH_PREFIX):
+        parts = path[len(_ACCOUNT_PATH_PREFIX):].split("/")
+        return "Devices/{id}" if len(parts) == 3 and parts[1] == "Devices" else parts[1] if len(parts) > 1 else path
+
+    return path
+
+# Main function to run the server standalone
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Local stand-in for the MyQ cloud service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--homes", type=int, default=1)
+    parser.add_argument("--gateways", type=int, default=1)
+    parser.add_argument("--openers", type=int, default=2)
+    parser.add_argument("--lamps", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--unauthorized-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--door-travel-time", type=float, default=10.0)
+    parser.add_argument("--token-ttl", type=int, default=3600)
+    args = parser.parse_args()
+
+    server = FakeMyQServer(
+        args.host, args.port, args.homes, args.gateways, args.openers, args.lamps,
+        latency=args.latency, jitter=args.jitter, errorRate=args.error_rate, unauthorizedRate=args.unauthorized_rate,
+        rateLimitRate=args.rate_limit_rate, doorTravelTime=args.door_travel_time, tokenTTL=args.token_ttl
+    )
+    print("Fake MyQ service listening at {} (username: {}, password: {})".format(server.baseURL, server.userName, server.password))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+        sys.exit(0)
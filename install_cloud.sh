@@ -1,4 +1,2 @@
 #!/usr/bin/env bash
-apt-get install -y python3-pyquery 
-
 pip install -r requirements_cloud.txt 
\ No newline at end of file
@@ -3,17 +3,33 @@
 Polglot v2 NodeServer for Chamberlain LiftMaster Garage Door Openers through MyQ Cloud Service
 by Goose66 (W. Randy King) kingwrandy@gmail.com
 """
+import time
+import importlib
+
+# record the time taken to import each module for the startup report
+_STARTUP_TIME = time.perf_counter()
+_IMPORT_TIMES = {}
+def _timedImport(name):
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    _IMPORT_TIMES[name] = time.perf_counter() - start
+    return module
+
 PGC = False
 try:
-    import polyinterface
+    polyinterface = _timedImport("polyinterface")
 except ImportError:
-    import pgc_interface as polyinterface
+    polyinterface = _timedImport("pgc_interface")
     PGC = True
 import sys
 import re
-import time
-from datetime import datetime
-import myqapi as api
+import math
+import calendar
+import threading
+import queue
+import heapq
+import functools
+api = _timedImport("myqapi") # Note: HTTP libraries are loaded on first call to the MyQ service
 
 LOGGER = polyinterface.LOGGER
 
@@ -24,8 +40,11 @@ ISY_INDEX_UOM = 25 # Index UOM for custom door states below (must match editor/N
 ISY_BOOL_UOM = 2 # Used for reporting status values for Controller and Gateway nodes
 ISY_SECONDS_UOM = 58 # Used for incrementally reporting state timer
 ISY_MINUTES_UOM = 45 # Used for incrementally reporting state timer
-ISY_HOURS_UOM = 45 # Used for incrementally reporting state timer
+ISY_HOURS_UOM = 20 # Used for incrementally reporting state timer
 ISY_ON_OFF_UOM = 78 # For non-dimmable light: 0-Off 100-On
+ISY_RAW_UOM = 56 # Used for reporting counts for the Controller node
+ISY_MILLISECONDS_UOM = 42 # Used for reporting the poll latency for the Controller node
+ISY_PERCENT_UOM = 51 # Used for reporting the error rate for the Controller node
 IX_GDO_ST_CLOSED = 0
 IX_GDO_ST_OPEN = 1
 IX_GDO_ST_STOPPED = 2
@@ -35,13 +54,63 @@ IX_GDO_ST_UNKNOWN = 9
 IX_LIGHT_ON = 100
 IX_LIGHT_OFF = 0
 IX_LIGHT_UNKNOWN = -1
+IX_CTR_SVC_DISCONNECTED = 0
+IX_CTR_SVC_CONNECTED = 1
+IX_CTR_SVC_OUTAGE = 2
+IX_CTR_SVC_RECOVERING = 3
 
 # custom parameter values for this nodeserver
 PARAM_USERNAME = "username"
 PARAM_PASSWORD = "password"
 PARAM_HOME_NAME = "homename"
-
-ACTIVE_UPDATE_DURATION = 300 # 5 minutes of active polling and then switch to inactive
+PARAM_ASYNC_CLIENT = "asyncclient"
+PARAM_STREAM_DEVICES = "streamdevices"
+PARAM_METRICS_FILE = "metricsfile"
+PARAM_KEEP_ALIVE = "keepalive"
+PARAM_ELAPSED_MINUTES_AFTER = "elapsedminutesafter"
+PARAM_ELAPSED_HOURS_AFTER = "elapsedhoursafter"
+
+# custom data keys for this nodeserver
+CUSTOM_DATA_TOKEN_INFO = "oauthtoken"
+CUSTOM_DATA_TRAVEL_TIMES = "traveltimes"
+CUSTOM_DATA_DEVICE_STATES = "devicestates"
+CUSTOM_DATA_HOME_PREFIXES = "homeprefixes"
+CUSTOM_DATA_RECONCILED_NODES = "reconcilednodes"
+
+# characters removed from ISY node addresses and names - <>`~!@#$%^&*(){}[]?/\;:"' (and . from addresses)
+INVALID_ADDRESS_CHARS = re.compile(r"[.<>`~!@#$%^&*(){}[\]?/\\;:\"']+")
+INVALID_NAME_CHARS = re.compile(r"[<>`~!@#$%^&*(){}[\]?/\\;:\"']+")
+SANITIZER_CACHE_SIZE = 1024 # number of sanitized node addresses and names kept (per sanitizer)
+
+# minimum seconds between stores of the snapshot of the device states restored at startup
+DEVICE_STATES_SAVE_INTERVAL = 300
+
+# number of polls between reconciling the nodes with the polled device list (automatic discovery)
+DISCOVERY_POLL_INTERVAL = 10
+
+# polling scheduler parameters
+POLL_DECAY_TIME = 120 # time constant (secs) for decay of polling interval from shortPoll to longPoll after activity
+POLL_IDLE_AFTER = 7200 # stretch the polling interval once all devices have been idle for 2 hours
+POLL_IDLE_FACTOR = 2 # multiple of longPoll for polling interval when idle or all gateways are offline
+POLL_MAX_ERROR_INTERVAL = 600 # maximum polling interval when backing off on consecutive errors
+
+# connection manager parameters
+CONNECT_RETRY_DELAY = 5 # initial delay (secs) for retrying a failed connection to the MyQ service (doubles on each failure)
+CONNECT_MAX_RETRY_DELAY = 300 # maximum delay (secs) for retrying a failed connection
+
+# learned door travel times and confirmation polls
+DOOR_TRAVELS = {IX_GDO_ST_OPENING: ("open", IX_GDO_ST_CLOSED, IX_GDO_ST_OPEN), IX_GDO_ST_CLOSING: ("close", IX_GDO_ST_OPEN, IX_GDO_ST_CLOSED)} # travel time key, starting state, and completed state for the moving states
+DOOR_TRAVEL_EWMA_WEIGHT = 0.3 # weight of the latest observed travel time in the learned travel time of a door
+DOOR_TRAVEL_MAX_SECS = 120 # longest plausible travel time (longer observations, e.g., across failed polls, are ignored)
+DOOR_CONFIRM_DELAYS = (2, 5, 10) # seconds after the expected completion of the travel to poll the door
+
+# command queue parameters
+COMMAND_QUEUE_SIZE = 32 # maximum number of devices with commands waiting for the MyQ service
+COMMAND_WORKERS = 2 # number of worker threads sending commands to the MyQ service
+COMMAND_COALESCE_WINDOW = 3 # duplicate commands for a device within 3 seconds are dropped
+ELAPSED_MINUTES_AFTER = 3600 # report state duration in minutes after door idle for 1 hour
+ELAPSED_HOURS_AFTER = 86400 # report state duration in hours after door idle for 1 day
+ELAPSED_TICK_INTERVAL = 10 # advance the state durations from the local clock every 10 seconds between polls
 
 # account for PGC 
 if PGC:
@@ -79,9 +148,8 @@ class MyQ_Device(polyinterface.Node):
 
         if deviceID is None:
 
-            # retrieve the deviceID from polyglot custom data
-            cData = self.controller.getCustomData(addr)
-            self._deviceID = cData
+            # retrieve the deviceID from the controller's index of the nodes (loaded from polyglot custom data)
+            self._deviceID = self.controller.getNodeDeviceID(addr)
 
         else:
             self._deviceID = deviceID
@@ -95,32 +163,41 @@ class GarageDoorOpener(MyQ_Device):
 
     id = "GARAGE_DOOR_OPENER"
     hint = [0x01, 0x12, 0x01, 0x00] # Residential/Barrier/Garage Door Opener
+    _stateChangeTime = None
+    _stateChangedAt = None
 
     # Open Door
     def cmd_don(self, command):
 
         LOGGER.info("Opening door for %s in DON command handler.", self.name)
 
-        # Place the controller in active polling mode
-        self.controller.setActiveMode()
-
-        if self.controller.myQConnection.open(self._deviceID):
-            self.setDriver("ST", IX_GDO_ST_OPENING)
-        else:
-            LOGGER.warning("Call to open() failed in DON command handler.")
+        # queue the command for the MyQ service and report the new state on completion, then poll the moving
+        # door around its expected completion time (or actively)
+        self.controller.submitCommand(self, "DON", self.controller.myQConnection.open, IX_GDO_ST_OPENING,
+                                      lambda: self.controller.startDoorMotion(self._deviceID, IX_GDO_ST_OPENING))
 
     # Close Door
     def cmd_dof(self, command):
 
         LOGGER.info("Closing door for %s in DOF command handler.", self.name)
 
-        # Place the controller in active polling mode
-        self.controller.setActiveMode()
+        # queue the command for the MyQ service and report the new state on completion, then poll the moving
+        # door around its expected completion time (or actively)
+        self.controller.submitCommand(self, "DOF", self.controller.myQConnection.close, IX_GDO_ST_CLOSING,
+                                      lambda: self.controller.startDoorMotion(self._deviceID, IX_GDO_ST_CLOSING))
 
-        if self.controller.myQConnection.close(self._deviceID):
-            self.setDriver("ST", IX_GDO_ST_CLOSING)
-        else:
-            LOGGER.warning("Call to close() failed in DOF command handler.")
+    # set the time of the last state change (seconds since the epoch) and anchor it to the
+    # local monotonic clock so that the state duration can be advanced between polls
+    def setStateChangeTime(self, changeTime):
+        if changeTime != self._stateChangeTime:
+            self._stateChangeTime = changeTime
+            self._stateChangedAt = time.monotonic() - (time.time() - changeTime)
+
+    # return the number of seconds in the current state (None if not known yet)
+    def getElapsedSecs(self):
+        if self._stateChangedAt is None:
+            return None
+        return max(int(time.monotonic() - self._stateChangedAt), 0)
 
     drivers = [
         {"driver": "ST", "value": IX_GDO_ST_UNKNOWN, "uom": ISY_INDEX_UOM},
@@ -145,11 +222,8 @@ class Light(MyQ_Device):
         # Place the controller in active polling mode
         self.controller.setActiveMode()
 
-        if self.controller.myQConnection.turnOn(self._deviceID):
-            self.setDriver("ST", IX_LIGHT_ON)
-        else:
-            LOGGER.warning("Call to turnOn() failed in DON command handler.")
-
+        # queue the command for the MyQ service and report the new state on completion
+        self.controller.submitCommand(self, "DON", self.controller.myQConnection.turnOn, IX_LIGHT_ON)
 
     # Turn off the light
     def cmd_dof(self, command):
@@ -159,10 +233,8 @@ class Light(MyQ_Device):
         # Place the controller in active polling mode
         self.controller.setActiveMode()
 
-        if self.controller.myQConnection.turnOff(self._deviceID):
-            self.setDriver("ST", IX_LIGHT_OFF)
-        else:
-            LOGGER.warning("Call to turnOff() failed in DOF command handler.")
+        # queue the command for the MyQ service and report the new state on completion
+        self.controller.submitCommand(self, "DOF", self.controller.myQConnection.turnOff, IX_LIGHT_OFF)
 
     drivers = [
         {"driver": "ST", "value": 0, "uom": ISY_ON_OFF_UOM}
@@ -174,6 +246,222 @@ class Light(MyQ_Device):
         "DFOF": cmd_dof
     }
 
+# Polling scheduler - runs the poll function on its own timer thread, independent of the
+# Polyglot shortPoll/longPoll ticks, with the interval to the next poll computed after each
+# poll by the interval function from the current device states and consecutive error count.
+# One-shot polls can also be scheduled at specific times (deadlines), e.g., for confirming
+# the expected completion of a door's travel
+class PollScheduler(object):
+
+    _pollFunc = None
+    _intervalFunc = None
+    _thread = None
+    _wakeEvent = None
+    _lock = None
+    _deadlines = None
+    _name = None
+    _stopped = False
+    _nextPoll = 0
+    _lastPoll = 0
+    _errorCount = 0
+    _interval = 60 # last interval computed (used if the interval function fails)
+
+    def __init__(self, pollFunc, intervalFunc, name="PollScheduler"):
+        self._pollFunc = pollFunc
+        self._intervalFunc = intervalFunc
+        self._name = name
+        self._wakeEvent = threading.Event()
+        self._lock = threading.Lock()
+        self._deadlines = []
+
+    # start the scheduler thread
+    def start(self):
+        if self._thread is None:
+            self._stopped = False
+            self._wakeEvent.clear()
+            self._lastPoll = time.monotonic()
+            self._nextPoll = self._lastPoll + self._getInterval()
+            self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+            self._thread.start()
+
+    # stop the scheduler thread
+    def stop(self):
+        self._stopped = True
+        self._wakeEvent.set()
+
+    # recompute the next polling time, e.g., when a command puts a device in motion
+    def reschedule(self):
+        self._wakeEvent.set()
+
+    # schedule one-shot polls at the specified times (monotonic clock) for the key, e.g., a device ID
+    def scheduleAt(self, key, deadlines):
+        with self._lock:
+            for deadline in deadlines:
+                heapq.heappush(self._deadlines, (deadline, key))
+        self._wakeEvent.set()
+
+    # cancel the one-shot polls scheduled for the key
+    def cancel(self, key):
+        with self._lock:
+            deadlines = [entry for entry in self._deadlines if entry[1] != key]
+            if len(deadlines) < len(self._deadlines):
+                heapq.heapify(deadlines)
+                self._deadlines = deadlines
+
+    # compute the interval to the next poll - keeps the last interval if the interval function fails
+    # so that an unexpected error doesn't end the polling
+    def _getInterval(self):
+        try:
+            self._interval = self._intervalFunc(self._errorCount)
+        except Exception as e:
+            LOGGER.error("Unexpected error computing polling interval: %s", str(e), exc_info=True)
+        return self._interval
+
+    # get the time of the next poll - the earlier of the next interval poll and one-shot poll
+    def _getNextPoll(self):
+        with self._lock:
+            return min(self._nextPoll, self._deadlines[0][0]) if self._deadlines else self._nextPoll
+
+    # scheduler thread
+    def _run(self):
+
+        while not self._stopped:
+
+            # wait until the next polling time or until woken to reschedule
+            if self._wakeEvent.wait(max(self._getNextPoll() - time.monotonic(), 0)):
+                self._wakeEvent.clear()
+                if self._stopped:
+                    break
+
+                # move the next poll up if the new interval (from the last poll) is shorter
+                self._nextPoll = min(self._nextPoll, self._lastPoll + self._getInterval())
+                if self._getNextPoll() > time.monotonic():
+                    continue
+
+            # remove the one-shot polls that are due (covered by this poll)
+            with self._lock:
+                now = time.monotonic()
+                while self._deadlines and self._deadlines[0][0] <= now:
+                    heapq.heappop(self._deadlines)
+
+            try:
+                success = self._pollFunc()
+            except Exception as e:
+                LOGGER.error("Unexpected error in polling scheduler: %s", str(e), exc_info=True)
+                success = False
+
+            self._errorCount = 0 if success else self._errorCount + 1
+            self._lastPoll = time.monotonic()
+            self._nextPoll = self._lastPoll + self._getInterval()
+
+            LOGGER.debug("Next poll in %.1f seconds (consecutive errors: %d).", self._nextPoll - self._lastPoll, self._errorCount)
+
+# Command queue - sends device commands to the MyQ service from a pool of worker threads so
+# that the Polyglot command handlers return immediately. Commands waiting for a device are
+# coalesced: a duplicate command is dropped and a contradictory command (e.g. DOF following
+# DON) replaces the waiting command, or cancels it if the new command was just sent.
+# A device is queued for the workers only while it has a waiting command and no command in
+# flight, so the workers never block on a busy device while other devices wait.
+class CommandQueue(object):
+
+    _queue = None
+    _workers = None
+    _maxSize = 0
+    _pending = None
+    _inFlight = None
+    _lastSent = None
+    _lock = None
+
+    def __init__(self, workers=COMMAND_WORKERS, maxSize=COMMAND_QUEUE_SIZE):
+        self._queue = queue.Queue()
+        self._workers = [threading.Thread(target=self._run, name="CommandWorker{}".format(i), daemon=True) for i in range(workers)]
+        self._maxSize = maxSize
+        self._pending = {}
+        self._inFlight = set()
+        self._lastSent = {}
+        self._lock = threading.Lock()
+
+    # start the worker threads
+    def start(self):
+        for worker in self._workers:
+            if not worker.is_alive():
+                worker.start()
+
+    # stop the worker threads once the queued commands are sent
+    def stop(self):
+        for worker in self._workers:
+            if worker.is_alive():
+                self._queue.put(None)
+
+    # submit a command for a device
+    # Parameters:
+    #   deviceID - ID of the device for the command
+    #   command - command for coalescing (e.g. "DON")
+    #   func - function to call with the device ID to send the command - returns success
+    #   onComplete - function called with success of the command once sent
+    # Returns: False if the queue is full, otherwise True
+    def submit(self, deviceID, command, func, onComplete):
+
+        with self._lock:
+
+            # drop the command if the same command was just sent (or is being sent) for the device
+            lastCommand, lastTime = self._lastSent.get(deviceID, (None, 0))
+            if lastCommand == command and time.monotonic() - lastTime < COMMAND_COALESCE_WINDOW:
+
+                # a contradictory command waiting for the device is cancelled by the new command
+                # (e.g. DON, DOF, DON sends DON once)
+                if deviceID in self._pending:
+                    LOGGER.debug("Waiting %s command for device %s cancelled by %s command just sent.", self._pending[deviceID][0], deviceID, command)
+                    del self._pending[deviceID]
+                else:
+                    LOGGER.debug("Duplicate %s command for device %s dropped.", command, deviceID)
+                return True
+
+            # if a command is already waiting for the device, replace it with the new command
+            if deviceID in self._pending:
+                if self._pending[deviceID][0] != command:
+                    LOGGER.debug("Waiting %s command for device %s replaced by %s command.", self._pending[deviceID][0], deviceID, command)
+                self._pending[deviceID] = (command, func, onComplete)
+                return True
+
+            if len(self._pending) >= self._maxSize:
+                return False
+
+            # queue the device unless a command is in flight for it (the device is queued again once sent)
+            self._pending[deviceID] = (command, func, onComplete)
+            if deviceID not in self._inFlight:
+                self._queue.put(deviceID)
+            return True
+
+    # worker thread
+    def _run(self):
+
+        while True:
+
+            deviceID = self._queue.get()
+            if deviceID is None:
+                break
+
+            # skip the device if its waiting command was cancelled
+            with self._lock:
+                pending = self._pending.pop(deviceID, None)
+                if pending is None:
+                    continue
+                command, func, onComplete = pending
+                self._inFlight.add(deviceID)
+                self._lastSent[deviceID] = (command, time.monotonic())
+
+            try:
+                onComplete(func(deviceID))
+            except Exception as e:
+                LOGGER.error("Unexpected error sending %s command for device %s: %s", command, deviceID, str(e), exc_info=True)
+
+            # send commands for a device one at a time - queue the device again if a command arrived while sending
+            with self._lock:
+                self._inFlight.discard(deviceID)
+                if deviceID in self._pending:
+                    self._queue.put(deviceID)
+
 # Controller class
 class Controller(polyinterface.Controller):
 
@@ -181,15 +469,71 @@ class Controller(polyinterface.Controller):
     _userName = ""
     _password = ""
     _homeName = None
+    _asyncClient = False
+    _streamDevices = False
+    _metricsFile = None
+    _keepAlive = False
+    _elapsedMinutesAfter = ELAPSED_MINUTES_AFTER
+    _elapsedHoursAfter = ELAPSED_HOURS_AFTER
     _customData = {}
-    _activePolling = False
+    _driverCache = None
     _lastActive = 0
     _lastPoll = 0
+    _lastStateChange = 0
+    _movingDevices = None
+    _offlineGateways = None
+    _deviceParents = None
+    _stateChangeTimes = None
+    _travelTimes = None
+    _doorMotions = None
+    _deviceStates = None
+    _deviceStatesChanged = False
+    _deviceStatesSaved = 0
+    _statesStale = False
+    _pollCount = 0
+    _discoveryPending = True
+    _missingNodes = None
+    _staleNodes = None
+    _changesReported = False
+    _nodeAddresses = None
+    _nodeDeviceIDs = None
+    _homes = None
+    _scheduler = None
+    _connector = None
+    _elapsedTicker = None
+    _commandQueue = None
+    _firstDeviceReport = True
+    _nodeUpdaters = None
+    _retryConnection = None
     myQConnection = None
 
     def __init__(self, poly):
         super(Controller, self).__init__(poly)
         self.name = "MyQ Service"
+        self._movingDevices = set()
+        self._offlineGateways = set()
+        self._deviceParents = {}
+        self._stateChangeTimes = {}
+        self._travelTimes = {}
+        self._doorMotions = {}
+        self._deviceStates = {}
+        self._missingNodes = set()
+        self._staleNodes = set()
+        self._nodeAddresses = {}
+        self._nodeDeviceIDs = {}
+        self._homes = {}
+        self._scheduler = PollScheduler(self._poll, self._getPollInterval)
+        self._connector = PollScheduler(self._connect, self._getConnectInterval, "MyQConnector")
+        self._elapsedTicker = PollScheduler(self._tickElapsedTimes, lambda errorCount: ELAPSED_TICK_INTERVAL, "ElapsedTicker")
+        self._commandQueue = CommandQueue()
+
+        # state update methods for each device type (family)
+        self._nodeUpdaters = {
+            api.API_DEVICE_TYPE_GATEWAY: self._updateGatewayNode,
+            api.API_DEVICE_TYPE_OPENER: self._updateOpenerNode,
+            api.API_DEVICE_TYPE_LAMP: self._updateLampNode
+        }
+        self._driverCache = {}
           
     # Start the node server
     def start(self):
@@ -204,6 +548,9 @@ class Controller(polyinterface.Controller):
         if level is not None:
             LOGGER.setLevel(int(level))
         
+        # load the door travel times learned in previous sessions
+        self._travelTimes = self.getCustomData(CUSTOM_DATA_TRAVEL_TIMES) or {}
+
         # remove all existing notices for the nodeserver
         self.removeNoticesAll()
 
@@ -217,6 +564,13 @@ class Controller(polyinterface.Controller):
 
         else:
 
+            # index the device IDs of the nodes previously saved to the polyglot database
+            # (stored in custom data by node address)
+            for addr in self._nodes:
+                deviceID = self.getCustomData(addr)
+                if isinstance(deviceID, str):
+                    self._indexNode(deviceID, addr)
+
             # load nodes previously saved to the polyglot database
             # Note: has to be done in two passes to ensure system (primary/parent) nodes exist
             # before device nodes
@@ -235,21 +589,49 @@ class Controller(polyinterface.Controller):
 
                     LOGGER.info("Adding previously saved node - addr: %s, name: %s, type: %s", addr, node["name"], node[NODE_DEF_ID_KEY])
 
+                    # keep the device grouped under its saved gateway node (if the gateway node was loaded)
+                    primary = node["primary"] if node.get("primary") in self.nodes else self.address
+
                     # add device and temperature controller nodes
                     if node[NODE_DEF_ID_KEY] == "GARAGE_DOOR_OPENER":
-                        self.addNode(GarageDoorOpener(self, self.address, addr, node["name"]))
+                        self.addNode(GarageDoorOpener(self, primary, addr, node["name"]))
                     if node[NODE_DEF_ID_KEY] == "LIGHT":
-                        self.addNode(Light(self, self.address, addr, node["name"]))
+                        self.addNode(Light(self, primary, addr, node["name"]))
+
+            # report the device states from the last session until the first poll of the MyQ service
+            self._restoreDeviceStates()
+
+            # start the command worker threads and the local timer for the state durations
+            self._commandQueue.start()
+            self._elapsedTicker.start()
+
+            # connect to the MyQ service right away (retried in the background)
+            self._connector.start()
 
             # Set the nodeserver status flag to indicate nodeserver is running
             self.setDriver("ST", 1, True, True)
+            self._logStartupReport("nodeserver online")
 
             # Report the logger level to the ISY
             self.setDriver("GV20", LOGGER.level, True, True)
  
     # shutdown the nodeserver on stop
     def stop(self):
+
+        # stop the connection manager, polling scheduler, command workers, and state duration timer
+        self._connector.stop()
+        self._scheduler.stop()
+        self._commandQueue.stop()
+        self._elapsedTicker.stop()
+
+        # store the latest device states for the next session
+        self._saveDeviceStates(True)
         
+        # close the connection kept from a failed login
+        if self._retryConnection is not None:
+            self._retryConnection.disconnect()
+            self._retryConnection = None
+
         # shudtown the connection to the MyQ service
         if self.myQConnection is not None:
             self.myQConnection.disconnect()
@@ -305,47 +687,188 @@ class Controller(polyinterface.Controller):
         self._updateNodeStates(True)
 
     # called every longPoll seconds (default 30)
+    # Note: device state polling is run by the polling scheduler on its own thread
+    # Note: the connection to the MyQ service is established by the connection manager on its own thread
     def longPoll(self):
 
-        # check for myQConnection
-        if self.myQConnection is None:
+        # keep the pooled connections to the MyQ API hosts open (if configured)
+        if self._keepAlive and self.myQConnection is not None:
+            self.myQConnection.keepAlive()
 
-            LOGGER.info("Establishing initial MyQ connection in longPoll()...")
+    # attempt to connect to the MyQ service - called from the connection manager, which retries
+    # with backoff until connected
+    def _connect(self):
 
-            # try and establish connection to MyQ service
-            if self._establishMyQConnection():
+        # wait for the network (e.g., when recovering from a power failure) before logging in
+        if not api.probeService():
+            LOGGER.warning("MyQ service is not reachable - waiting for the network before logging in...")
+            return False
 
-                # update the driver values of all nodes (force report)
-                self._updateNodeStates(True)
+        LOGGER.info("Establishing MyQ connection in connection manager...")
 
-                # startup active mode polling
-                self.setActiveMode()
+        rc = self._establishMyQConnection()
+        if rc == api.LOGIN_SUCCESS:
 
-        # otherwise, poll if not in active polling mode
-        elif not self._activePolling:
-            LOGGER.info("Updating node states in longPoll()...")
-            self._updateNodeStates()          
+            # stop retrying once connected
+            self._connector.stop()
 
-    # called every shortPoll seconds (default 5)
-    def shortPoll(self):
+            # update the driver values of all nodes (force report)
+            self._updateNodeStates(True)
 
-        # only run if MyQ connection is established
-        if self.myQConnection is not None:
-            
-            # if in active polling mode, then update the node states
-            if self._activePolling:
-                LOGGER.info("Updating node states in shortPoll()...")
-                self._updateNodeStates()          
-
-            # reset active flag if 5 minutes has passed
-            if self._lastActive < (time.time() - ACTIVE_UPDATE_DURATION):
-                self._activePolling = False
-
-    # Set the active polling mode (short polling interval)
-    def setActiveMode(self):
-        self._activePolling = True
+            # startup polling in active mode
+            self.setActiveMode()
+            self._scheduler.start()
+
+            # open the connections to the MyQ API hosts for the first commands
+            self.myQConnection.warmConnections()
+
+            # keep the access token fresh in the background
+            self.myQConnection.startTokenRefresh(self._reportTokenRefreshStatus)
+            return True
+
+        # stop retrying if the login can't succeed without a configuration change (avoids locking out the account)
+        elif rc in (api.LOGIN_BAD_AUTHENTICATION, api.LOGIN_BAD_HOME_NAME):
+            LOGGER.error("MyQ login failed due to the configuration - not retrying until the nodeserver is restarted.")
+            self._connector.stop()
+
+        return False
+
+    # compute the delay (in seconds) before the next connection attempt - immediately at first,
+    # then with capped exponential backoff
+    # Parameters:
+    #   errorCount - number of consecutive connection attempts that have failed
+    def _getConnectInterval(self, errorCount):
+
+        if errorCount == 0:
+            return 0
+        else:
+            return min(CONNECT_RETRY_DELAY * 2 ** (errorCount - 1), CONNECT_MAX_RETRY_DELAY)
+
+    # Set the active polling mode (polling interval decays from shortPoll to longPoll)
+    # Parameters:
+    #   deviceID - device put in motion (polled individually while in motion)
+    def setActiveMode(self, deviceID=None):
         self._lastActive =  time.time()
+        if deviceID is not None:
+            self._movingDevices.add(deviceID)
+
+        # recompute the next polling time with the new activity
+        self._scheduler.reschedule()
+
+    # Start tracking a door put in motion by a command (once accepted by the MyQ service) - the door is polled
+    # for confirmation around its expected completion time if its travel time has been learned, otherwise actively
+    # Parameters:
+    #   deviceID - device ID of the door
+    #   state - moving state of the door (IX_GDO_ST_OPENING or IX_GDO_ST_CLOSING)
+    def startDoorMotion(self, deviceID, state):
+        if self._trackDoorMotion(deviceID, state, time.time()):
+            self._movingDevices.add(deviceID)
+            self._scheduler.reschedule()
+        else:
+            self.setActiveMode(deviceID)
     
+    # Submit a command for a device node to the command queue
+    # Parameters:
+    #   node - device node for which the command is sent
+    #   command - command (e.g. "DON") - used for coalescing commands for the device
+    #   func - MyQ connection method to call with the device ID (e.g., open())
+    #   value - state value to report for the node when the command completes successfully
+    #   onSuccess - function called when the command completes successfully (optional)
+    # Note: a command that fails or is dropped by coalescing doesn't call onSuccess
+    def submitCommand(self, node, command, func, value, onSuccess=None):
+
+        # report the new state or failure when the command completes on the worker thread
+        def onComplete(success):
+            if success:
+                self.reportNodeDriver(node, "ST", value)
+                if onSuccess is not None:
+                    onSuccess()
+            else:
+                LOGGER.warning("Call to %s() failed for %s.", func.__name__, node.name)
+
+        if not self._commandQueue.submit(node._deviceID, command, func, onComplete):
+            LOGGER.warning("Command queue is full - %s command for %s dropped.", command, node.name)
+
+    # Report the driver value for the node only if it has changed since last reported
+    # Parameters:
+    #   node - node for which to report the driver value
+    #   driver - driver (e.g. "ST") to report
+    #   value - value of the driver
+    #   uom - unit of measure for the value (defaults to the UOM of the driver)
+    #   forceReport - report the value even if it has not changed
+    def reportNodeDriver(self, node, driver, value, uom=None, forceReport=False):
+
+        # check the value against the last value reported for the node
+        nodeCache = self._driverCache.setdefault(node.address, {})
+        if not forceReport and nodeCache.get(driver) == (value, uom):
+            return
+
+        nodeCache[driver] = (value, uom)
+        node.setDriver(driver, value, True, forceReport, uom)
+
+        # log the startup report on the first report of a device state
+        if self._firstDeviceReport and node is not self:
+            self._firstDeviceReport = False
+            self._logStartupReport("first device state reported")
+
+    # Report the duration of the current state (GV0) for the node at a granularity
+    # based on how long the node has been in the current state - seconds, then
+    # minutes, then hours - so that an idle door doesn't generate a report every poll
+    def reportElapsedTime(self, node, elapsedSecs, forceReport=False):
+
+        if self._elapsedHoursAfter > 0 and elapsedSecs >= self._elapsedHoursAfter:
+            self.reportNodeDriver(node, "GV0", elapsedSecs // 3600, ISY_HOURS_UOM, forceReport)
+        elif self._elapsedMinutesAfter > 0 and elapsedSecs >= self._elapsedMinutesAfter:
+            self.reportNodeDriver(node, "GV0", elapsedSecs // 60, ISY_MINUTES_UOM, forceReport)
+        else:
+            self.reportNodeDriver(node, "GV0", elapsedSecs, ISY_SECONDS_UOM, forceReport)
+
+    # report the latency of the last poll (GV3) and the error rate of the recent calls to the
+    # MyQ service APIs (GV4), and export the metrics to the metrics file if configured
+    def _reportMetrics(self, pollSecs, forceReport=False):
+
+        # Note: the oAuth steps and keep-alive pings are excluded from the service error rate
+        calls = errors = 0
+        for endpoint, metrics in self.myQConnection.getMetrics()["endpoints"].items():
+            if not endpoint.startswith(("oauth_", "ping_")):
+                calls += metrics["recent_calls"]
+                errors += metrics["error_rate"] * metrics["recent_calls"]
+
+        self.reportNodeDriver(self, "GV3", int(pollSecs * 1000), forceReport=forceReport)
+        self.reportNodeDriver(self, "GV4", round(errors * 100 / calls) if calls else 0, forceReport=forceReport)
+
+        if self._metricsFile:
+            self.myQConnection.writeMetricsFile(self._metricsFile)
+
+    # store the oAuth tokens for the MyQ connection in polyglot custom data
+    # Note: this is called by the MyQ connection whenever the tokens are updated
+    def _saveTokenInfo(self, tokenInfo):
+
+        if tokenInfo is not None:
+            self.addCustomData(CUSTOM_DATA_TOKEN_INFO, dict(tokenInfo, username=self._userName))
+            self.saveCustomData(self._customData)
+
+    # report the status of the background refresh of the oAuth tokens (GV2 = consecutive failures)
+    # Note: this is called by the MyQ connection after each refresh attempt
+    def _reportTokenRefreshStatus(self, failures):
+
+        if failures > 0:
+            LOGGER.warning("Background refresh of MyQ access token failed (%d consecutive failures).", failures)
+
+        self.reportNodeDriver(self, "GV2", failures)
+
+    # log the time since startup and the time taken to import each module (including
+    # the modules loaded on first use by the MyQ API)
+    def _logStartupReport(self, event):
+
+        importTimes = dict(_IMPORT_TIMES, **api.IMPORT_TIMES)
+        LOGGER.info(
+            "Startup report - %s at %.0f ms after start. Module import times: %s",
+            event,
+            (time.perf_counter() - _STARTUP_TIME) * 1000,
+            ", ".join("{} {:.0f} ms".format(name, secs * 1000) for name, secs in importTimes.items())
+        )
+
     # helper method for storing custom data
     def addCustomData(self, key, data):
 
@@ -358,6 +881,10 @@ class Controller(polyinterface.Controller):
         # return data from custom data for key
         return self._customData.get(key)
 
+    # get the device ID for a node address from the index of the nodes (None if not indexed)
+    def getNodeDeviceID(self, addr):
+        return self._nodeDeviceIDs.get(addr)
+
     # Get custom configuration parameter values
     def _getCustomParams(self):
 
@@ -375,11 +902,40 @@ class Controller(polyinterface.Controller):
             complete = False
 
         # get the optional home name configuration parameter
-        self._homeName = customParams.get(PARAM_HOME_NAME)
+        # Note: may be a comma separated list of home names, or "*" for all homes
+        homeName = customParams.get(PARAM_HOME_NAME, "").strip()
+        if homeName == api.ALL_HOMES:
+            self._homeName = api.ALL_HOMES
+        else:
+            self._homeName = [name.strip() for name in homeName.split(",") if name.strip()] or None
+
+        # get the optional flag for running on the asyncio MyQ client
+        self._asyncClient = customParams.get(PARAM_ASYNC_CLIENT, "false").lower() in ("true", "yes", "1")
+        if self._asyncClient and not api.asyncClientAvailable():
+            LOGGER.warning("The aiohttp package is not installed - using the standard MyQ client.")
+            self._asyncClient = False
+
+        # get the optional flag for parsing the device list as it is received
+        self._streamDevices = customParams.get(PARAM_STREAM_DEVICES, "false").lower() in ("true", "yes", "1")
+
+        # get the optional flag for keeping the pooled connections to the MyQ API hosts open between commands
+        self._keepAlive = customParams.get(PARAM_KEEP_ALIVE, "false").lower() in ("true", "yes", "1")
+
+        # get the optional path of the file for exporting the MyQ service metrics (Prometheus text format)
+        self._metricsFile = customParams.get(PARAM_METRICS_FILE) or None
+
+        # get the optional thresholds for reporting state durations in minutes and hours
+        try:
+            self._elapsedMinutesAfter = int(customParams.get(PARAM_ELAPSED_MINUTES_AFTER, ELAPSED_MINUTES_AFTER))
+            self._elapsedHoursAfter = int(customParams.get(PARAM_ELAPSED_HOURS_AFTER, ELAPSED_HOURS_AFTER))
+        except ValueError:
+            LOGGER.warning("Invalid value for state duration reporting thresholds in configuration - using defaults.")
+            self._elapsedMinutesAfter = ELAPSED_MINUTES_AFTER
+            self._elapsedHoursAfter = ELAPSED_HOURS_AFTER
 
         return complete
 
-    # establish MyQ service connection
+    # establish MyQ service connection - returns the login result code (e.g., api.LOGIN_SUCCESS)
     def _establishMyQConnection(self):
 
         # remove existing connection error notices
@@ -390,28 +946,56 @@ class Controller(polyinterface.Controller):
             self.removeNotice("bad_parm")
             self.removeNotice("login_error")
 
-        # create a connection to the MyQ cloud service
-        conn = api.MyQ(LOGGER)
-
-        # login using the provided credentials
-        rc = conn.loginToService(self._userName, self._password, self._homeName)
+        # create a connection to the MyQ cloud service, or reuse the connection from the last failed
+        # login so that its circuit breakers keep failing fast through a MyQ service outage
+        # Note: the async client runs on its own event loop thread behind a blocking bridge
+        conn = self._retryConnection
+        if conn is None:
+            if self._asyncClient:
+                conn = api.AsyncMyQBridge(LOGGER, self._saveTokenInfo)
+            else:
+                conn = api.MyQ(LOGGER, self._saveTokenInfo)
+
+        # resume the session with the oAuth tokens stored from the last session for the same user,
+        # otherwise login using the provided credentials
+        tokenInfo = self.getCustomData(CUSTOM_DATA_TOKEN_INFO)
+        if tokenInfo is not None and tokenInfo.get("username") == self._userName:
+            LOGGER.info("Resuming MyQ session with stored oAuth tokens...")
+            rc = conn.resumeSession(self._userName, self._password, tokenInfo, self._homeName)
+        else:
+            rc = conn.loginToService(self._userName, self._password, self._homeName)
         
         # if login and connection was successful, return true
         if rc == api.LOGIN_SUCCESS:
             
             # store the connection object in the controller
             self.myQConnection = conn
-            return True
+            self._retryConnection = None
+
+            # if devices are loaded from multiple homes, namespace the node addresses and names by home
+            homes = conn.getHomes()
+            if len(homes) > 1:
+                prefixes = self._getHomePrefixes(homes)
+                self._homes = {accountID: (prefixes[accountID], homeName) for accountID, homeName in homes}
+            else:
+                self._homes = {}
 
-        elif rc == api.LOGIN_BAD_AUTHENTICATION:
+            # store the tokens (and account ID) for the next session
+            self._saveTokenInfo(conn.getTokenInfo())
+            return rc
+
+        # keep the failed connection for the next login attempt and report the service status
+        self._retryConnection = conn
+        self.reportNodeDriver(self, "GV0", self._getServiceStatus(conn, False))
+
+        if rc == api.LOGIN_BAD_AUTHENTICATION:
             self.addNotice({"bad_auth":"Could not login to the MyQ service with the specified credentials. Please check the 'username' and 'password' parameter values in the Custom Configuration Parameters and restart the nodeserver."})
-            return False
         elif rc == api.LOGIN_BAD_HOME_NAME:
-            self.addNotice({"bad_parm":"Could not find the specified Home Name in the accounts from the MyQ service. Please check the 'homename' parameter value in the Custom Configuration Parameters and restart the nodeserver."})
-            return False
+            self.addNotice({"bad_parm":"Could not find the specified Home Name(s) in the accounts from the MyQ service. Please check the 'homename' parameter value in the Custom Configuration Parameters and restart the nodeserver."})
         else:
-            self.addNotice({"login_error":"There was an error connecting to the MyQ service. Please check the log files and correct the issue before restarting the nodeserver."})
-            return False
+            self.addNotice({"login_error":"There was an error connecting to the MyQ service. The nodeserver will keep retrying - please check the log files if the error persists."})
+
+        return rc
 
     # discover MyQ devices in account 
     def _discover(self):
@@ -430,133 +1014,535 @@ class Controller(polyinterface.Controller):
             LOGGER.warning("getDeviceList() returned no devices.")
 
         else:
+            self._reconcileDevices(devices)
+
+    # get the node address prefixes for the homes (by account ID) - new homes are assigned the next unused
+    # prefix and the prefixes are stored so that the node addresses are kept if the homes are reordered,
+    # added, or removed
+    # Note: the custom data is sent to polyglot with the tokens after login
+    def _getHomePrefixes(self, homes):
+
+        prefixes = dict(self.getCustomData(CUSTOM_DATA_HOME_PREFIXES) or {})
+        used = set(prefixes.values())
+        number = 0
+        for accountID, homeName in homes:
+            if accountID not in prefixes:
+                number += 1
+                while "h{}".format(number) in used:
+                    number += 1
+                prefixes[accountID] = "h{}".format(number)
+                used.add(prefixes[accountID])
+
+        self.addCustomData(CUSTOM_DATA_HOME_PREFIXES, prefixes)
+        return prefixes
+
+    # reconcile the nodes with the devices from the MyQ service - adds nodes for new devices and
+    # reports renamed, re-parented, and removed (stale) devices
+    # Parameters:
+    #   devices - device records returned from the MyQ service
+    def _reconcileDevices(self, devices):
+
+        # index the devices that have nodes (gateways, openers, and lamps) by node address in one pass
+        found = {}
+        for device in devices:
+            if device.type in self._nodeUpdaters:
+                found[self._getNodeAddress(device.id, device.account_id)] = device
+
+        existing = set(self.nodes) - {self.address}
+        added = found.keys() - existing
+        removed = existing - found.keys()
+
+        # add nodes for the new devices
+        # Note: gateways are added first since they are the primary nodes of the other devices
+        for addr in sorted(added, key=lambda addr: found[addr].type != api.API_DEVICE_TYPE_GATEWAY):
+            self._addDeviceNode(addr, found[addr])
+
+        # check the existing nodes for devices renamed or moved to another gateway in the MyQ service since
+        # the last reconciliation (stored in custom data, since Polyglot keeps the original names and primaries)
+        # Note: Polyglot can't rename or re-parent a node, so the changes are reported for the user
+        lastReconciled = self.getCustomData(CUSTOM_DATA_RECONCILED_NODES) or {}
+        changes = []
+        for addr in existing & found.keys():
+            device, node = found[addr], self.nodes[addr]
+            isGateway = device.type == api.API_DEVICE_TYPE_GATEWAY
+            lastName, lastPrimary = lastReconciled.get(addr, (node.name, None if isGateway else node.parent.address))
+
+            name = self._getNodeName(device)
+            if lastName != name:
+                LOGGER.info("Device %s renamed in the MyQ service from %s to %s.", device.id, lastName, name)
+                changes.append("{} (renamed to {})".format(lastName, name))
+            node.name = name
+
+            # Note: a node without a known gateway (grouped under the controller) is just regrouped
+            if not isGateway:
+                primary = self._getNodeAddress(device.parent_id, device.account_id)
+                if primary in self.nodes:
+                    if lastPrimary != primary and lastPrimary != self.address:
+                        LOGGER.info("Device %s moved in the MyQ service from gateway %s to %s.", device.id, lastPrimary, primary)
+                        changes.append("{} (moved to gateway {})".format(name, self.nodes[primary].name))
+                    node.parent = self.nodes[primary]
+
+        # report the changes, and remove the notice once a reconciliation finds no changes
+        if changes:
+            self.addNotice({"changed_nodes": "Devices changed in the MyQ service: {}. Rename or regroup the nodes in the ISY Administrative Console as needed.".format(", ".join(changes))})
+        elif self._changesReported:
+            self.removeNotice("changed_nodes")
+        self._changesReported = bool(changes)
+
+        # store the names and primaries of the nodes as reconciled
+        reconciled = {}
+        for addr in found.keys() & self.nodes.keys():
+            node = self.nodes[addr]
+            reconciled[addr] = [node.name, None if found[addr].type == api.API_DEVICE_TYPE_GATEWAY else node.parent.address]
+        reconciledChanged = reconciled != lastReconciled
+        if reconciledChanged:
+            self.addCustomData(CUSTOM_DATA_RECONCILED_NODES, reconciled)
+
+        # report the nodes of devices missing from two device lists in a row as stale
+        # Note: this keeps a home that failed to poll (with multiple homes) from flagging its nodes
+        stale = removed & self._missingNodes
+        self._missingNodes = removed
+        if stale and stale != self._staleNodes:
+            names = sorted(self.nodes[addr].name for addr in stale)
+            LOGGER.warning("Nodes for devices no longer in the MyQ service: %s.", ", ".join(names))
+            self.addNotice({"stale_nodes": "Nodes for devices no longer in the MyQ service: {}. Delete the nodes using the Polyglot Dashboard if the devices were removed.".format(", ".join(names))})
+        elif self._staleNodes and not stale:
+            self.removeNotice("stale_nodes")
+        self._staleNodes = stale
+
+        # send custom data added by new (or changed) nodes to polyglot
+        if added or reconciledChanged:
+            self.saveCustomData(self._customData)
 
-            # iterate devices
-            # Note: has to be done in two passes to ensure system (primary/parent) nodes exist
-            # before device nodes
-            # first pass for gateway nodes
-            for device in devices:
-    
-                if device["type"] == api.API_DEVICE_TYPE_GATEWAY:
-                    
-                    devAddr = getValidNodeAddress(device["id"])
+        LOGGER.debug("Reconciled nodes with %d devices: %d added, %d changed, %d stale.", len(found), len(added), len(changes), len(stale))
 
-                    # If no node already exists for the gateway, then add a node
-                    if devAddr not in self.nodes:
-                    
-                        LOGGER.info("Discovered new device - id: %s, name: %s, type: %s", device["id"], device["description"], device["type"])
+    # add a node for a new device and report its state
+    # Parameters:
+    #   addr - node address for the device
+    #   device - device record returned from the MyQ service
+    def _addDeviceNode(self, addr, device):
 
-                        gwNode = Gateway(
-                            self,
-                            self.address, # temporarily set primary to controller
-                            devAddr,
-                            getValidNodeName(device["description"])
-                        )
-                        self.addNode(gwNode)
+        LOGGER.info("Discovered new device - id: %s, name: %s, type: %s", device.id, device.description, device.type)
 
-                        # update the state value for the gateway node (ST = Online)
-                        gwNode.setDriver("ST", int(device["online"]), True, True)
+        # gateways are their own primary nodes, and openers and lamps are grouped under their gateway
+        # Note: the device ID of a gateway is stored in custom data (like the other devices) for indexing at start
+        if device.type == api.API_DEVICE_TYPE_GATEWAY:
+            node = Gateway(self, self.address, addr, self._getNodeName(device))
+            self.addCustomData(addr, device.id)
+        else:
+            # Note: the device is grouped under the controller if its gateway has no node
+            nodeClass = GarageDoorOpener if device.type == api.API_DEVICE_TYPE_OPENER else Light
+            primary = self._getNodeAddress(device.parent_id, device.account_id)
+            if primary not in self.nodes:
+                primary = self.address
+            node = nodeClass(self, primary, addr, self._getNodeName(device), device.id)
+
+        self.addNode(node)
+
+        # update the state values for the node (force report)
+        self._updateNodeState(device, True)
+
+    # poll the MyQ service for device states - called from the polling scheduler
+    # Note: only the doors in motion are polled if there are any
+    # Note: the device sets are copied before iterating since command threads also update them
+    def _poll(self):
+
+        moving = [deviceID for deviceID in list(self._movingDevices) if self._deviceParents.get(deviceID) not in self._offlineGateways]
+        if moving:
+            LOGGER.info("Updating moving device states in polling scheduler...")
+            return self._updateDeviceStates(moving)
+        else:
+            LOGGER.info("Updating node states in polling scheduler...")
+            return self._updateNodeStates()
 
-            # second pass for device nodes
-            for device in devices:
-    
-                if device["type"] in (api.API_DEVICE_TYPE_OPENER, api.API_DEVICE_TYPE_LAMP):
+    # compute the interval (in seconds) until the next poll from the current device states
+    # Parameters:
+    #   errorCount - number of consecutive polls that have failed
+    def _getPollInterval(self, errorCount):
 
-                    devAddr = getValidNodeAddress(device["id"])
-                
-                    # If no node already exists for the device, then add a node for the device
-                    if devAddr not in self.nodes:
-                
-                        LOGGER.info("Discovered new device - id: %s, name: %s, type: %s", device["id"], device["description"], device["type"])
+        fastInterval = int(self.polyConfig.get("shortPoll", 10))
+        slowInterval = max(int(self.polyConfig.get("longPoll", 60)), fastInterval)
+        currentTime = time.time()
+
+        # copy the device sets since command threads also update them
+        movingDevices = list(self._movingDevices)
+        offlineGateways = set(self._offlineGateways)
+
+        # poll fast while a door behind an online gateway is in motion, unless the door is covered by
+        # confirmation polls around its expected completion time
+        if any(self._deviceParents.get(deviceID) not in offlineGateways and not self._isDoorConfirming(deviceID) for deviceID in movingDevices):
+            interval = fastInterval
+
+        # poll slowest if all of the gateways are offline or the devices have been idle for hours
+        elif (offlineGateways and offlineGateways.issuperset(list(self._deviceParents.values()))) or \
+            min(currentTime - self._lastActive, currentTime - self._lastStateChange) > POLL_IDLE_AFTER:
+            interval = slowInterval * POLL_IDLE_FACTOR
+
+        # otherwise decay smoothly from the fast interval to the slow interval since the last activity
+        else:
+            elapsed = currentTime - max(self._lastActive, self._lastStateChange)
+            interval = fastInterval + (slowInterval - fastInterval) * (1 - math.exp(-max(elapsed, 0) / POLL_DECAY_TIME))
+
+        # back off exponentially on consecutive errors
+        if errorCount > 0:
+            interval = min(interval * 2 ** errorCount, max(POLL_MAX_ERROR_INTERVAL, interval))
+
+        return interval
 
-                        # add opener nodes
-                        if device["type"] == api.API_DEVICE_TYPE_OPENER:
-                    
-                            devNode = GarageDoorOpener(
-                                self,
-                                getValidNodeAddress(device["parent_id"]), # set the primary to the gateway address
-                                devAddr,
-                                getValidNodeName(device["description"]),
-                                device["id"]
-                            )
-                            self.addNode(devNode)
-
-                            # update the state values for the opener node
-                            devNode.setDriver("ST", getDoorState(device["state"]), True, True)
-                            devNode.setDriver("GV0", calcElapsedSecs(device["last_changed"]), True, True)
-         
-                        # add lamp nodes
-                        elif device["type"] == api.API_DEVICE_TYPE_LAMP:
-                    
-                            devNode = Light(
-                                self,
-                                getValidNodeAddress(device["parent_id"]), # set the primary to the gateway address
-                                devAddr,
-                                getValidNodeName(device["description"]),
-                                device["id"]
-                            )
-                            self.addNode(devNode)
-
-                            # update the state values for the light node
-                            devNode.setDriver("ST", getLampState(device["state"]), True, True)
-
-            # send custom data added by new nodes to polyglot
-            self.saveCustomData(self._customData)
-    
     # update the state of all nodes from the MyQ service
     # Parameters:
     #   forceReport - force reporting of all driver values (for query)
     def _updateNodeStates(self, forceReport=False):
 
-        # initially set driver values for controller to false to reflect service connection is gone
-        serviceStatus = 0
+        success = False
+        start = time.monotonic()
 
         # get device details from myQ service
-        devices = self.myQConnection.getDeviceList()
+        # Note: streamed devices are reported as they are received, so always iterate them
+        if self._streamDevices:
+            devices, changed = self.myQConnection.iterDevices(), True
+        else:
+            devices, changed = self.myQConnection.pollDeviceList()
+
         if devices is None:
-            LOGGER.warning("getDeviceList() returned no devices.")
+            LOGGER.warning("Retrieving the device list returned no devices.")
 
         else:
 
-            # If devices were returned, set the service status to True
-            serviceStatus = 1
-
-            # iterate the devices
-            for device in devices:
-
-                # find the matching node
-                devAddr = getValidNodeAddress(device["id"])
-                if devAddr in self.nodes:
-                    node = self.nodes[devAddr]                
-                
-                    # set the state values based on the device type
-                    if device["type"] == api.API_DEVICE_TYPE_GATEWAY:
-                        
-                        # update the state value for the gateway node (ST = Online)
-                        node.setDriver("ST", int(device["online"]), True, forceReport)
-
-                    elif device["type"] == api.API_DEVICE_TYPE_OPENER:
-
-                        # update the state values for the opener node
-                        value = getDoorState(device["state"])
-                        node.setDriver("ST", value, True, forceReport)
-                        node.setDriver("GV0", calcElapsedSecs(device["last_changed"]), True, forceReport)
-
-                        # if a device state has a door in motion, set the active polling mode
-                        if value in [IX_GDO_ST_CLOSING, IX_GDO_ST_OPENING, IX_GDO_ST_UNKNOWN]:
-                            self.setActiveMode()
-        
-                    elif device["type"] == api.API_DEVICE_TYPE_LAMP:
-    
-                        # update the state values for the light node
-                        node.setDriver("ST", getLampState(device["state"]), True, forceReport)
+            # Note: a streamed device list that fails part way fails the poll (the nodes are not reconciled
+            # with the partial list and the restored states are not marked reconciled)
+            try:
+
+                # reconcile the nodes with the polled device list every DISCOVERY_POLL_INTERVAL polls if the
+                # device list has changed since last reconciled (no additional calls to the MyQ service)
+                self._discoveryPending = self._discoveryPending or changed
+                # Note: an error reconciling the nodes is logged (and retried) without failing the poll
+                if self._discoveryPending and self._pollCount % DISCOVERY_POLL_INTERVAL == 0:
+                    devices = list(devices)
+                    try:
+                        self._reconcileDevices(devices)
+                        self._discoveryPending = False
+                    except Exception as e:
+                        LOGGER.error("Unexpected error reconciling nodes with the device list: %s", str(e), exc_info=True)
+                self._pollCount += 1
+
+                # iterate the devices if the device list changed since the last poll
+                # Note: the state durations are advanced by the local timer between changes
+                if changed or forceReport:
+                    for device in devices:
+                        self._updateNodeState(device, forceReport)
+
+                # the device states restored at startup are now reconciled with the MyQ service
+                if self._statesStale:
+                    LOGGER.info("Device states restored from the last session reconciled with the MyQ service.")
+                    self._statesStale = False
+                    self.reportNodeDriver(self, "GV5", 0)
+
+                self._saveDeviceStates()
+
+                # If devices were returned, the service is connected
+                success = True
+
+            except api.DeviceListStreamError:
+                LOGGER.warning("Streaming the device list failed part way.")
+
+        # Update the controller node state
+        self.reportNodeDriver(self, "GV0", self._getServiceStatus(self.myQConnection, success), forceReport=forceReport)
+        self._reportMetrics(time.monotonic() - start, forceReport)
+
+        # Update the last polling time
+        self._lastPoll = time.time()
+
+        return success
+
+    # update the state of only the specified devices from the MyQ service
+    # Parameters:
+    #   deviceIDs - list of device IDs to retrieve and update
+    def _updateDeviceStates(self, deviceIDs):
+
+        success = True
+        start = time.monotonic()
+
+        for deviceID in deviceIDs:
+
+            # get the device details from the myQ service
+            device = self.myQConnection.getDevice(deviceID)
+            if device is None:
+                LOGGER.warning("getDevice() returned no device for device ID %s.", deviceID)
+                self._movingDevices.discard(deviceID)
+                success = False
+
+            else:
+                self._updateNodeState(device)
+
+        self._saveDeviceStates()
 
         # Update the controller node state
-        self.setDriver("GV0", serviceStatus, True, forceReport)
+        self.reportNodeDriver(self, "GV0", self._getServiceStatus(self.myQConnection, success))
+        self._reportMetrics(time.monotonic() - start)
 
         # Update the last polling time
         self._lastPoll = time.time()
 
+        return success
+
+    # get the service status (GV0) from the result of the last call and the circuit breakers of the connection
+    # Parameters:
+    #   conn - connection to the MyQ service
+    #   success - whether the last call to the MyQ service succeeded
+    def _getServiceStatus(self, conn, success):
+
+        circuitState = conn.getCircuitState()
+        if circuitState == api.CIRCUIT_OPEN:
+            return IX_CTR_SVC_OUTAGE
+        elif circuitState == api.CIRCUIT_HALF_OPEN:
+            return IX_CTR_SVC_RECOVERING
+        elif success:
+            return IX_CTR_SVC_CONNECTED
+        else:
+            return IX_CTR_SVC_DISCONNECTED
+
+    # update the state of the node for the specified device
+    # Parameters:
+    #   device - device record returned from the MyQ service
+    #   forceReport - force reporting of all driver values (for query)
+    def _updateNodeState(self, device, forceReport=False):
+
+        # find the matching node and dispatch on the device type (family)
+        node = self.nodes.get(self._getNodeAddress(device.id, device.account_id))
+        self._nodeUpdaters[device.type](node, device, forceReport)
+
+    # advance the state durations (GV0) of the opener nodes from the local clock - called from
+    # the state duration timer between polls
+    def _tickElapsedTimes(self):
+
+        for node in list(self.nodes.values()):
+            if isinstance(node, GarageDoorOpener):
+                elapsedSecs = node.getElapsedSecs()
+                if elapsedSecs is not None:
+                    self.reportElapsedTime(node, elapsedSecs)
+
+        return True
+
+    # update the state of a gateway node (node is None if there is no node for the device)
+    def _updateGatewayNode(self, node, device, forceReport):
+
+        # track the gateway states used for computing the polling interval
+        if device.online:
+            self._offlineGateways.discard(device.id)
+        else:
+            self._offlineGateways.add(device.id)
+
+        if node is not None:
+
+            # update the state value for the gateway node (ST = Online)
+            self.reportNodeDriver(node, "ST", int(device.online), forceReport=forceReport)
+            self._recordDeviceState(node, int(device.online))
+
+    # update the state of a garage door opener node (node is None if there is no node for the device)
+    def _updateOpenerNode(self, node, device, forceReport):
+
+        # track the device states used for computing the polling interval
+        # Note: the travel of a door covered by confirmation polls doesn't restart the active polling
+        changeTime = self._trackDeviceState(device, not self._isDoorConfirming(device.id))
+
+        if node is not None:
+
+            # update the state values for the opener node
+            value = getDoorState(device.state)
+            node.setStateChangeTime(changeTime)
+            self.reportNodeDriver(node, "ST", value, forceReport=forceReport)
+            self.reportElapsedTime(node, node.getElapsedSecs(), forceReport)
+            self._recordDeviceState(node, value, changeTime)
+
+            # if a device state has a door in motion, poll the door around its expected completion
+            # time (or set the active polling mode for the door), otherwise stop polling the door
+            # individually and learn the travel time from the completed motion
+            if value in DOOR_TRAVELS and self._trackDoorMotion(device.id, value, changeTime):
+                self._movingDevices.add(device.id)
+            elif value in [IX_GDO_ST_CLOSING, IX_GDO_ST_OPENING, IX_GDO_ST_UNKNOWN]:
+                self.setActiveMode(device.id)
+            else:
+                self._completeDoorMotion(device.id, value, changeTime)
+                self._movingDevices.discard(device.id)
+
+    # track a door in motion and schedule confirmation polls around its expected completion time from
+    # the learned travel time - returns whether the door is covered by the confirmation polls
+    # Parameters:
+    #   deviceID - device ID of the door
+    #   state - moving state of the door (IX_GDO_ST_OPENING or IX_GDO_ST_CLOSING)
+    #   startTime - time (seconds since the epoch) the door started moving
+    def _trackDoorMotion(self, deviceID, state, startTime):
+
+        # a motion already tracked keeps its confirmation polls
+        # Note: the start time reported by the MyQ service replaces the time of the command
+        motion = self._doorMotions.get(deviceID)
+        if motion is not None and motion[0] == state and motion[1] >= startTime:
+            return self._isDoorConfirming(deviceID)
+
+        # schedule the confirmation polls at the delays after the expected completion time
+        confirmUntil = 0
+        travelSecs = self._travelTimes.get(deviceID, {}).get(DOOR_TRAVELS[state][0])
+        self._scheduler.cancel(deviceID)
+        if travelSecs is not None:
+            completeAt = time.monotonic() + startTime + travelSecs - time.time()
+            deadlines = [completeAt + delay for delay in DOOR_CONFIRM_DELAYS]
+            confirmUntil = deadlines[-1]
+            self._scheduler.scheduleAt(deviceID, deadlines)
+            LOGGER.debug("Door %s expected to complete travel in %.1f seconds.", deviceID, completeAt - time.monotonic())
+
+        self._doorMotions[deviceID] = (state, startTime, confirmUntil)
+        return confirmUntil > time.monotonic()
+
+    # check whether a door in motion is covered by confirmation polls (not late to complete its travel)
+    def _isDoorConfirming(self, deviceID):
+        motion = self._doorMotions.get(deviceID)
+        return motion is not None and motion[2] > time.monotonic()
+
+    # stop tracking the motion of a door and learn the travel time of the door if it completed the travel
+    # Parameters:
+    #   deviceID - device ID of the door
+    #   state - current (stationary) state of the door
+    #   changeTime - time (seconds since the epoch) the door entered the state
+    def _completeDoorMotion(self, deviceID, state, changeTime):
+
+        motion = self._doorMotions.get(deviceID)
+        if motion is None:
+            return
+
+        # keep tracking the motion while the door still reports the state it is travelling from, e.g.,
+        # during the alarm period before a door closes, up to the longest plausible travel time
+        movingState, startTime, confirmUntil = motion
+        key, startingState, completedState = DOOR_TRAVELS[movingState]
+        if state == startingState and time.time() - startTime <= DOOR_TRAVEL_MAX_SECS:
+            return
+
+        del self._doorMotions[deviceID]
+        self._scheduler.cancel(deviceID)
+
+        # ignore a travel that was stopped or reversed, or that took implausibly long
+        travelSecs = changeTime - startTime
+        if state != completedState or not 0 < travelSecs <= DOOR_TRAVEL_MAX_SECS:
+            return
+
+        # update the learned travel time (exponentially weighted moving average) and store it for the next session
+        travelTimes = self._travelTimes.setdefault(deviceID, {})
+        learnedSecs = travelTimes.get(key)
+        if learnedSecs is not None:
+            travelSecs = learnedSecs + DOOR_TRAVEL_EWMA_WEIGHT * (travelSecs - learnedSecs)
+        travelTimes[key] = round(travelSecs, 1)
+
+        LOGGER.info("Learned %s travel time for door %s: %.1f seconds.", key, deviceID, travelTimes[key])
+        self.addCustomData(CUSTOM_DATA_TRAVEL_TIMES, self._travelTimes)
+        self.saveCustomData(self._customData)
+
+    # update the state of a light node (node is None if there is no node for the device)
+    def _updateLampNode(self, node, device, forceReport):
+
+        # track the device states used for computing the polling interval
+        self._trackDeviceState(device)
+
+        if node is not None:
+
+            # update the state values for the light node
+            value = getLampState(device.state)
+            self.reportNodeDriver(node, "ST", value, forceReport=forceReport)
+            self._recordDeviceState(node, value)
+
+    # record the state of a device node in the snapshot of the device states restored at startup
+    # Parameters:
+    #   node - device node
+    #   value - state (ST) value of the node
+    #   changeTime - time (seconds since the epoch) of the last state change (for opener nodes)
+    def _recordDeviceState(self, node, value, changeTime=None):
+
+        state = [value] if changeTime is None else [value, int(changeTime)]
+        if self._deviceStates.get(node.address) != state:
+            self._deviceStates[node.address] = state
+            self._deviceStatesChanged = True
+
+    # store the snapshot of the device states in custom data if changed - at most every
+    # DEVICE_STATES_SAVE_INTERVAL seconds unless forced (e.g., on stop)
+    def _saveDeviceStates(self, force=False):
+
+        if self._deviceStatesChanged and (force or time.monotonic() - self._deviceStatesSaved >= DEVICE_STATES_SAVE_INTERVAL):
+            self._deviceStatesChanged = False
+            self._deviceStatesSaved = time.monotonic()
+            self.addCustomData(CUSTOM_DATA_DEVICE_STATES, dict(self._deviceStates))
+            self.saveCustomData(self._customData)
+
+    # report the device states stored in the last session for the device nodes, marked as stale
+    # (GV5) until reconciled with the first poll of the MyQ service
+    def _restoreDeviceStates(self):
+
+        storedStates = self.getCustomData(CUSTOM_DATA_DEVICE_STATES) or {}
+        self._deviceStates = {addr: state for addr, state in storedStates.items() if addr in self.nodes and addr != self.address}
+
+        for addr, state in self._deviceStates.items():
+            node = self.nodes[addr]
+            if isinstance(node, GarageDoorOpener) and len(state) > 1:
+                node.setStateChangeTime(state[1])
+                self.reportElapsedTime(node, node.getElapsedSecs(), True)
+            self.reportNodeDriver(node, "ST", state[0], forceReport=True)
+
+        if self._deviceStates:
+            LOGGER.info("Restored the states of %d devices from the last session (stale until the first poll).", len(self._deviceStates))
+
+        self._statesStale = bool(self._deviceStates)
+        self.reportNodeDriver(self, "GV5", int(self._statesStale), forceReport=True)
+
+    # track the parent gateway and last state change of a device for computing the polling interval
+    # and return the time of the last state change
+    # Parameters:
+    #   device - device record returned from the MyQ service
+    #   isActivity - whether the state change counts as activity for the polling interval
+    def _trackDeviceState(self, device, isActivity=True):
+        changeTime = self._getStateChangeTime(device)
+        self._deviceParents[device.id] = device.parent_id
+        if isActivity:
+            self._lastStateChange = max(self._lastStateChange, changeTime)
+        return changeTime
+
+    # get the time (seconds since the epoch) of the last state change of a device
+    # Note: the timestamp from the MyQ service is only parsed when the state changes
+    def _getStateChangeTime(self, device):
+
+        lastChanged, changeTime = self._stateChangeTimes.get(device.id, (None, 0))
+        if lastChanged != device.last_changed:
+            changeTime = getTimestampTime(device.last_changed)
+            self._stateChangeTimes[device.id] = (device.last_changed, changeTime)
+
+        return changeTime
+
+    # get the node address for a device - prefixed with the home when loading multiple homes
+    # Note: the address is looked up in the index of the nodes, and indexed when first computed
+    def _getNodeAddress(self, deviceID, accountID):
+
+        addr = self._nodeAddresses.get(deviceID)
+        if addr is None:
+            home = self._homes.get(accountID)
+            if home is None:
+                addr = getValidNodeAddress(deviceID)
+            else:
+                addr = getValidNodeAddress(deviceID, home[0])
+            self._indexNode(deviceID, addr)
+
+        return addr
+
+    # add a device ID and node address to the (bidirectional) index of the nodes
+    def _indexNode(self, deviceID, addr):
+        self._nodeAddresses[deviceID] = addr
+        self._nodeDeviceIDs[addr] = deviceID
+
+    # get the node name for a device - prefixed with the home name when loading multiple homes
+    def _getNodeName(self, device):
+
+        home = self._homes.get(device.account_id)
+        if home is None:
+            return getValidNodeName(device.description)
+        else:
+            return getValidNodeName("{} - {}".format(home[1], device.description))
+
     # sends a stop command for the nodeserver to Polyglot
     def _stopMe(self):
         LOGGER.info('Asking Polyglot to stop me.')
@@ -564,7 +1550,11 @@ class Controller(polyinterface.Controller):
 
     drivers = [
         {"driver": "ST", "value": 0, "uom": ISY_BOOL_UOM},
-        {"driver": "GV0", "value": 0, "uom": ISY_BOOL_UOM},
+        {"driver": "GV0", "value": IX_CTR_SVC_DISCONNECTED, "uom": ISY_INDEX_UOM},
+        {"driver": "GV2", "value": 0, "uom": ISY_RAW_UOM},
+        {"driver": "GV3", "value": 0, "uom": ISY_MILLISECONDS_UOM},
+        {"driver": "GV4", "value": 0, "uom": ISY_PERCENT_UOM},
+        {"driver": "GV5", "value": 0, "uom": ISY_BOOL_UOM},
         {"driver": "GV20", "value": 0, "uom": ISY_INDEX_UOM}
     ]
     commands = {
@@ -599,28 +1589,29 @@ def getLampState(state):
     else:
         return IX_LIGHT_UNKNOWN
 
-# Calculate an elapsed time since the provided timestamp string
-def calcElapsedSecs(timestamp):
-    
-    # translate timestamp string into datetime value
-    dt = datetime.strptime(timestamp[:19], "%Y-%m-%dT%H:%M:%S")
-    
-    # return the total number of seconds between now and the specified timestring as an integer
-    return int((datetime.utcnow() - dt).total_seconds())
+# Returns the time (seconds since the epoch) of a (UTC) timestamp string from the MyQ service
+def getTimestampTime(timestamp):
+    return calendar.timegm(time.strptime(timestamp[:19], "%Y-%m-%dT%H:%M:%S"))
 
 # Removes invalid charaters and lowercase ISY Node address
-def getValidNodeAddress(s):
+# Note: a prefixed address keeps the end of the string (e.g. the unique end of a serial number)
+@functools.lru_cache(maxsize=SANITIZER_CACHE_SIZE)
+def getValidNodeAddress(s, prefix=""):
 
     # remove <>`~!@#$%^&*(){}[]?/\;:"' characters
-    addr = re.sub(r"[.<>`~!@#$%^&*(){}[\]?/\\;:\"']+", "", s)
+    addr = INVALID_ADDRESS_CHARS.sub("", s)
 
-    return addr[:14].lower()
+    if prefix:
+        return (prefix + addr[len(prefix) - 14:]).lower()
+    else:
+        return addr[:14].lower()
 
 # Removes invalid charaters for ISY Node description
+@functools.lru_cache(maxsize=SANITIZER_CACHE_SIZE)
 def getValidNodeName(s):
 
     # remove <>`~!@#$%^&*(){}[]?/\;:"' characters from names
-    return re.sub(r"[<>`~!@#$%^&*(){}[\]?/\\;:\"']+", "", s)
+    return INVALID_NAME_CHARS.sub("", s)
 
 # Main function to establish Polyglot connection
 if __name__ == "__main__":
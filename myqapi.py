@@ -5,16 +5,54 @@ by Goose66 (W. Randy King) kingwrandy@gmail.com
 """
 
 # Standard Python Library
+import os
+import re
 import sys
 import time
+import math
+import bisect
 import logging
 import string
+import json
+import threading
+import socket
+import random
+import hashlib
+import codecs
+import importlib
+import importlib.util
+import concurrent.futures
+import functools
+import email.utils
+from collections import Counter, deque
 from urllib.parse import parse_qs, urlsplit
-
-# 3rd Party Libraries
-import requests
-import pkce
-from pyquery import PyQuery
+from html.parser import HTMLParser
+
+# Time taken to import each lazily loaded module (for startup reporting)
+IMPORT_TIMES = {}
+
+# Proxy for a module that is imported on first use. Keeps the HTTP libraries (and asyncio)
+# out of the startup path until the first call to the MyQ service.
+class _LazyModule(object):
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def __getattr__(self, attr):
+        module = self.__dict__["_module"]
+        if module is None:
+            start = time.perf_counter()
+            module = importlib.import_module(self.__dict__["_name"])
+            IMPORT_TIMES[self.__dict__["_name"]] = time.perf_counter() - start
+            self.__dict__["_module"] = module
+        return getattr(module, attr)
+
+# 3rd Party Libraries (and asyncio) - loaded on first use
+requests = _LazyModule("requests")
+pkce = _LazyModule("pkce")
+aiohttp = _LazyModule("aiohttp") # optional - only required for the AsyncMyQ class
+asyncio = _LazyModule("asyncio")
 
 # Configure a module level logger for module testing
 _LOGGER = logging.getLogger()
@@ -23,33 +61,55 @@ if not _LOGGER.hasHandlers():
 
 # MyQ REST API v6 spec.
 
+# Base URLs of the MyQ cloud services - individual services may be overridden (e.g., to
+# point to a local test server) with the baseURLs parameter of the MyQ constructor
+API_BASE_URLS = {
+    "accounts": "https://accounts.myq-cloud.com",
+    "devices": "https://devices.myq-cloud.com",
+    "gdo": "https://account-devices-gdo.myq-cloud.com",
+    "lamp": "https://account-devices-lamp.myq-cloud.com",
+    "oauth": "https://partner-identity.myq-cloud.com"
+}
+
 _API_SESSION_HEADERS = {
     "User-Agent": "null"
 }
 _API_GET_ACCOUNT_INFO = {
-    "url": "https://accounts.myq-cloud.com/api/v6.0/accounts",
+    "name": "accounts",
+    "service": "accounts",
+    "path": "/api/v6.0/accounts",
     "method": "GET"
 }
 _API_GET_DEVICE_LIST = {
-    "url": "https://devices.myq-cloud.com/api/v5.2/Accounts/{account_id}/Devices",
+    "name": "device_list",
+    "service": "devices",
+    "path": "/api/v5.2/Accounts/{account_id}/Devices",
     "method": "GET"
 }
 _API_GET_DEVICE_PROPERTIES = {
-    "url": "https://devices.myq-cloud.com/api/v5.2/Accounts/{account_id}/Devices/{device_id}",
+    "name": "device_properties",
+    "service": "devices",
+    "path": "/api/v5.2/Accounts/{account_id}/Devices/{device_id}",
     "method": "GET"
 }
 _API_GDO_DEVICE_ACTION = {
-    "url": "https://account-devices-gdo.myq-cloud.com/api/v5.2/Accounts/{account_id}/door_openers/{device_id}/{command}",
+    "name": "gdo_action",
+    "service": "gdo",
+    "path": "/api/v5.2/Accounts/{account_id}/door_openers/{device_id}/{command}",
     "method": "PUT"
 }
 _API_LAMP_DEVICE_ACTION = {
-    "url": "https://account-devices-lamp.myq-cloud.com/api/v5.2/Accounts/{account_id}/lamps/{device_id}/{command}",
+    "name": "lamp_action",
+    "service": "lamp",
+    "path": "/api/v5.2/Accounts/{account_id}/lamps/{device_id}/{command}",
     "method": "PUT"
 }
 
-_OAUTH_BASE_URL = "https://partner-identity.myq-cloud.com"
-_OAUTH_AUTHORIZATION_URL = f"{_OAUTH_BASE_URL}/connect/authorize"
-_OAUTH_TOKEN_URL = f"{_OAUTH_BASE_URL}/connect/token"
+# Services for the device API calls - connections are pooled (and kept alive) per host
+_API_HOST_SERVICES = ["devices", "gdo", "lamp"]
+
+_OAUTH_AUTHORIZATION_PATH = "/connect/authorize"
+_OAUTH_TOKEN_PATH = "/connect/token"
 _OAUTH_SESSION_HEADERS = {
     "User-Agent": "null"
 }
@@ -76,53 +136,506 @@ API_DEVICE_STATE_CLOSING = "closing"
 API_DEVICE_STATE_ON = "on"
 API_DEVICE_STATE_OFF = "off"
 
+# Exception raised by the iterator returned from iterDevices() if the device list stream fails part way
+class DeviceListStreamError(Exception):
+    pass
+
 LOGIN_BAD_AUTHENTICATION = 1
 LOGIN_ERROR = 3
 LOGIN_BAD_HOME_NAME = 4
 LOGIN_SUCCESS = 0
 
+# Home name for selecting all of the homes (accounts) authorized to the MyQ user
+ALL_HOMES = "*"
+
 # Timeout durations for HTTP calls - defined here for easy tweaking
 _HTTP_OAUTH_TIMEOUT = 12.05
 _HTTP_GET_TIMEOUT = 12.05
 _HTTP_PUT_TIMEOUT = 3.05
 _HTTP_POST_TIMEOUT = 6.05
 
-class MyQ(object):
+# Timeout for the DNS lookup and TCP connection of the network readiness probe (see probeService())
+_NETWORK_PROBE_TIMEOUT = 3.05
+
+# Connection pooling for the MyQ API hosts
+_HTTP_POOL_SIZE = 4 # maximum number of connections kept open per API host
+_HTTP_KEEPALIVE_IDLE = 45 # seconds a pooled connection may be idle before being pinged by keepAlive()
+
+# Size of the chunks of the login page fed to the HTML parser
+_HTML_PARSE_CHUNK_SIZE = 2048
+
+# Size of the chunks read from the device list response stream in iterDevices()
+_JSON_STREAM_CHUNK_SIZE = 4096
+
+# Seconds a retrieved device list is served to further callers of pollDeviceList() (until invalidated by a device action)
+_DEVICE_LIST_CACHE_TTL = 2.0
+
+# Metrics for the calls to the MyQ service
+_METRICS_SAMPLES = 500 # number of recent calls per endpoint kept for the latency percentiles and error rate
+_METRICS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0) # latency histogram buckets (seconds) for the Prometheus exporter
+
+# Circuit breaker states for the calls to the MyQ service
+CIRCUIT_CLOSED = 0
+CIRCUIT_OPEN = 1
+CIRCUIT_HALF_OPEN = 2
+
+# Circuit breaker timing
+_CIRCUIT_FAILURE_THRESHOLD = 3 # consecutive failed calls to an endpoint that open its circuit
+_CIRCUIT_RETRY_DELAY = 30 # initial delay before a trial call through an open circuit (doubles each time the circuit re-opens)
+_CIRCUIT_MAX_RETRY_DELAY = 900 # maximum delay before a trial call through an open circuit
+_CIRCUIT_TRIAL_TIMEOUT = 30 # seconds after which a trial call that never completed is given up
+
+# Client-side rate limiting of the calls to the MyQ service (token bucket shared by all calls)
+_RATE_LIMIT_MAX_RATE = 2.0 # maximum sustained calls per second
+_RATE_LIMIT_MIN_RATE = 0.1 # minimum calls per second the rate is cut back to when throttled
+_RATE_LIMIT_INCREASE = 0.02 # calls per second the rate is raised on each successful call (after being cut back)
+_RATE_LIMIT_BURST = 10 # maximum calls made back to back
+_RATE_LIMIT_COMMAND_RESERVE = 2 # calls of the burst reserved for device commands and logins
+_RATE_LIMIT_MAX_WAIT = 10 # maximum seconds a call waits for the rate limiter before being skipped
+_RATE_LIMIT_RETRY_AFTER = 10 # seconds to pause the calls when throttled without a Retry-After header
+_RATE_LIMIT_MAX_RETRY_AFTER = 900 # maximum seconds to pause the calls for a Retry-After header
+
+# Background refresh of the oAuth access token
+_TOKEN_REFRESH_MARGIN = 600 # refresh the access token at least 10 minutes before it expires
+_TOKEN_REFRESH_JITTER = 300 # plus a random amount of up to 5 minutes
+_TOKEN_REFRESH_RETRY = 30 # initial delay for retrying a failed refresh (doubles on each failure)
+_TOKEN_REFRESH_MAX_RETRY = 300 # maximum delay for retrying a failed refresh
+
+def asyncClientAvailable():
+    """Returns whether the optional aiohttp package required for the AsyncMyQ class is
+    installed (without importing it)
+    """
+    return importlib.util.find_spec("aiohttp") is not None
+
+def probeService(baseURLs=None, logger=_LOGGER):
+    """Checks whether the hosts used for logging into the MyQ service can be resolved and
+    connected to (DNS lookup and TCP connection only - no HTTP request is made), e.g., for
+    waiting for the network to come up before logging in
+
+    Parameters:
+    baseURLs -- base URLs overriding the MyQ service URLs (dictionary, see API_BASE_URLS)
+    logger -- logger for reporting the probe failure
+
+    Returns:
+    boolean indicating whether the hosts are reachable
+    """
+
+    urls = dict(API_BASE_URLS, **(baseURLs or {}))
+    for service in ("oauth", "accounts"):
+        parts = urlsplit(urls[service])
+        try:
+            with socket.create_connection((parts.hostname, parts.port or (443 if parts.scheme == "https" else 80)), timeout=_NETWORK_PROBE_TIMEOUT):
+                pass
+        except OSError as e:
+            logger.debug("MyQ service host %s not reachable: %s", parts.hostname, str(e))
+            return False
+
+    return True
+
+# Base class for the MyQ clients - holds the oAuth token and account state, and the request flows
+# (building the requests and handling the responses) run by the transport of each client
+class _MyQBase(object):
 
     _accessToken = ""
     _refreshToken = ""
     _tokenType = ""
     _tokenTTL = 0
     _lastTokenUpdate = 0
+    _authHeader = ""
+    _tokenCallback = None
+    _tokenRefreshCallback = None
+    _tokenRefreshFailures = 0
 
     _userName = ""
     _password = ""
 
+    _baseURLs = None
     _accountID = ""
+    _accounts = None
     _apiSession = None
     _oAuthSession = None
+    _devices = None
+    _deviceListETags = None
+    _deviceListHashes = None
+    _deviceListLock = None
+    _deviceListFlight = None
+    _deviceListSnapshot = None
+    _deviceListGeneration = 0
+    _metrics = None
+    _breakers = None
+    _rateLimiter = None
     _logger = None
   
     # Primary constructor method
-    def __init__(self, logger=_LOGGER):
+    def __init__(self, logger=_LOGGER, tokenCallback=None, baseURLs=None):
 
         # set instance variables
         self._logger = logger   
+        self._tokenCallback = tokenCallback
+        self._baseURLs = dict(API_BASE_URLS, **(baseURLs or {}))
+
+        # selected accounts (homes) and the device registry and device list state for each account
+        self._accounts = []
+        self._devices = {}
+        self._deviceListETags = {}
+        self._deviceListHashes = {}
+        self._deviceListLock = threading.Lock()
+        self._metrics = _APIMetrics()
+        self._breakers = _CircuitBreakers(logger)
+        self._rateLimiter = _RateLimiter(logger)
+
+    def getTokenInfo(self):
+        """Returns the current oAuth tokens and account ID for persisting between sessions
 
-    def loginToService(self, userName, password, homeName=None):
-        """Logs into the MyQ account and retrieves the acess token via oAuth session
+        Returns:
+        dictionary of token values (see resumeSession()) or None if no token has been retrieved
+        """
+
+        if not self._accessToken:
+            return None
+
+        return {
+            "access_token": self._accessToken,
+            "refresh_token": self._refreshToken,
+            "token_type": self._tokenType,
+            "expires_at": self._lastTokenUpdate + self._tokenTTL,
+            "account_id": self._accountID
+        }
+
+    def getHomes(self):
+        """Returns the homes (accounts) selected when logging in
+
+        Returns:
+        list (array) of tuples of account ID and home name
+        """
+
+        return self._accounts
+
+    def getMetrics(self):
+        """Returns a snapshot of the metrics for the calls to the MyQ service
+
+        Returns:
+        dictionary with the metrics for each endpoint ("endpoints") - call and error counts,
+        bytes received, HTTP status counts, and latency percentiles and error rate of the recent calls -
+        and the number of logins, token refreshes, throttling responses, and calls skipped by the rate limiter
+        """
+
+        return self._metrics.snapshot()
+
+    def getCircuitState(self):
+        """Returns the overall state of the circuit breakers for the endpoints of the MyQ service
+
+        Returns:
+        CIRCUIT_OPEN if calls to any endpoint are failing fast, CIRCUIT_HALF_OPEN if any open circuit
+        is due for (or making) a trial call, otherwise CIRCUIT_CLOSED
+        """
+
+        return self._breakers.state()
+
+    def writeMetricsFile(self, path):
+        """Writes the metrics for the calls to the MyQ service to a file in the Prometheus text
+        format, e.g., for the textfile collector of the Prometheus node exporter
 
         Parameters:
-        username -- username (email address) for MyQ service (string)
-        password -- password for MyQ service (string)
-        homeName -- specifies a "Home Name" for indicating which account to use if multiple accounts are present
+        path -- path of the metrics file (string)
 
         Returns:
-        code indicating login success: LOGIN_SUCCESS, LOGIN_BAD_AUTHENTICATION, LOGIN_ERROR
+        Boolean indicating success of write
         """
-        self._logger.debug("in API loginToService()...")
 
-        rc = self._oAuthRetrieveToken(userName, password)
+        # write to a temporary file and rename so the collector never reads a partial file
+        try:
+            with open(path + ".tmp", "w") as f:
+                f.write(self._metrics.prometheusText())
+            os.replace(path + ".tmp", path)
+            return True
+
+        except OSError as e:
+            self._logger.warning("Unable to write metrics file %s: %s", path, str(e))
+            return False
+
+    # set the token values from the token info returned from the oAuth service
+    def _updateToken(self, tokenInfo, refreshed=False):
+
+        self._metrics.countEvent("token_refreshes" if refreshed else "logins")
+
+        self._accessToken = tokenInfo["access_token"]
+        self._tokenType = tokenInfo["token_type"]
+        self._refreshToken = tokenInfo["refresh_token"]
+        self._tokenTTL = tokenInfo.get("expires_in", _OAUTH_TOKEN_TTL)
+        self._lastTokenUpdate = time.time()
+
+        # swap in the authorization header for API calls in a single (atomic) assignment
+        self._authHeader = self._tokenType + " " + self._accessToken
+
+        # notify the owner of the connection that the tokens changed
+        if self._tokenCallback is not None:
+            self._tokenCallback(self.getTokenInfo())
+
+    # set the token values from token info persisted from a previous session
+    def _restoreToken(self, tokenInfo):
+
+        self._accessToken = tokenInfo.get("access_token", "")
+        self._tokenType = tokenInfo.get("token_type", "")
+        self._refreshToken = tokenInfo.get("refresh_token", "")
+        self._accountID = tokenInfo.get("account_id", "")
+
+        # express the stored expiration time as a TTL from the current time
+        self._lastTokenUpdate = time.time()
+        self._tokenTTL = tokenInfo.get("expires_at", 0) - self._lastTokenUpdate
+        self._authHeader = self._tokenType + " " + self._accessToken
+
+    # compute the number of seconds until the next background refresh of the access token
+    # Note: the refresh time is jittered so that multiple instances don't refresh together
+    def _getTokenRefreshDelay(self):
+
+        # if the last refresh failed, retry with exponential backoff
+        if self._tokenRefreshFailures > 0:
+            return min(_TOKEN_REFRESH_RETRY * 2 ** (self._tokenRefreshFailures - 1), _TOKEN_REFRESH_MAX_RETRY)
+
+        refreshTime = self._lastTokenUpdate + self._tokenTTL - _TOKEN_REFRESH_MARGIN - random.uniform(0, _TOKEN_REFRESH_JITTER)
+        return max(refreshTime - time.time(), 0)
+
+    # record the result of a background refresh of the access token and notify the owner
+    def _setTokenRefreshResult(self, success):
+
+        self._tokenRefreshFailures = 0 if success else self._tokenRefreshFailures + 1
+
+        if self._tokenRefreshCallback is not None:
+            self._tokenRefreshCallback(self._tokenRefreshFailures)
+
+    # get the URL for the specified REST API
+    def _getAPIURL(self, api):
+        return self._baseURLs[api["service"]] + api["path"]
+
+    # get the host URLs for the device API calls with the endpoint names of their keep-alive pings
+    # (without duplicates, e.g., for a local test server)
+    # Note: the lamp host is skipped once the device lists have been retrieved and show no lamps
+    def _getPingHosts(self):
+
+        registries = list(self._devices.values())
+        hasLamps = not registries or any(device.type == API_DEVICE_TYPE_LAMP for registry in registries for device in registry.getDevices())
+
+        hosts = {}
+        for service in _API_HOST_SERVICES:
+            if service != _API_LAMP_DEVICE_ACTION["service"] or hasLamps:
+                hosts.setdefault(self._baseURLs[service], "ping_" + service)
+
+        return hosts
+
+    # select the accounts for the specified home name(s) from the accounts list
+    def _selectAccounts(self, accounts, homeName):
+
+        # if all homes were specified, select all of the accounts
+        if homeName == ALL_HOMES:
+            selected = accounts
+
+        # if home names were specified, search the accounts for each home name 
+        elif homeName:
+            selected = []
+            for name in ([homeName] if isinstance(homeName, str) else homeName):
+                account = next((a for a in accounts if _strip(a.get("name")) == _strip(name)), None)
+
+                # if the homename was not found, return bad home name error
+                if account is None:
+                    return LOGIN_BAD_HOME_NAME
+                elif account not in selected:
+                    selected.append(account)
+
+        # otherwise just select the first listed account
+        else:
+            selected = accounts[:1]
+
+        self._accounts = [(a["id"], a.get("name")) for a in selected]
+        self._accountID = self._accounts[0][0]
+        return LOGIN_SUCCESS
+
+    # get the IDs of the selected accounts
+    def _getAccountIDs(self):
+        return [account[0] for account in self._accounts] or [self._accountID]
+
+    # get the device registry for the account
+    def _getRegistry(self, accountID):
+
+        registry = self._devices.get(accountID)
+        if registry is None:
+            registry = _DeviceRegistry(self._logger, accountID)
+            self._devices[accountID] = registry
+
+        return registry
+
+    # get the ID of the account containing the device
+    def _getDeviceAccountID(self, deviceID):
+
+        for accountID, registry in list(self._devices.items()):
+            if registry.hasDevice(deviceID):
+                return accountID
+
+        return self._accountID
+
+    # process the response from the device list API for the account and return the list of
+    # device records and whether the device list changed since the last poll
+    # Parameters:
+    #   generation - generation of the device list state when the request was made
+    # Note: an unchanged payload (304 Not Modified or same content hash) is not re-parsed
+    def _processDeviceList(self, response, accountID, generation):
+
+        registry = self._getRegistry(accountID)
+
+        if response.status_code == 304:
+            return registry.getDevices(), False
+
+        if response.status_code == 200:
+
+            # compare the payload to the last one processed before parsing the JSON
+            eTag = response.headers.get("ETag")
+            contentHash = hashlib.blake2b(response.content, digest_size=16).digest()
+            if contentHash == self._deviceListHashes.get(accountID):
+                self._commitDeviceList(accountID, generation, eTag, contentHash)
+                return registry.getDevices(), False
+
+            try:
+                deviceInfo = response.json()
+            except ValueError as e:
+                self._logger.error("Error parsing device list: %s", str(e))
+                return None, False
+
+            if "items" in deviceInfo:
+                devices = registry.updateDevices(deviceInfo["items"])
+                self._commitDeviceList(accountID, generation, eTag, contentHash)
+                return devices, True
+
+        if response.status_code == 401:
+            self._logger.error("There was an authentication error with the MyQ account: %s",  _parseResponseMsg(response))
+        else:
+            self._logger.error("Error retrieving device list: %s",  _parseResponseMsg(response))
+
+        return None, False
+
+    # combine the device lists (and changed flags) polled from each account
+    # Note: the devices from the accounts that could be polled are returned if any accounts fail
+    def _combineDeviceLists(self, results):
+
+        if len(results) == 1:
+            return results[0]
+
+        deviceLists = [devices for devices, changed in results if devices is not None]
+        if not deviceLists:
+            return None, False
+
+        return [device for devices in deviceLists for device in devices], any(changed for devices, changed in results)
+
+    # get the conditional request headers for the device list API for the account
+    def _getDeviceListHeaders(self, accountID):
+        eTag = self._deviceListETags.get(accountID)
+        return {"If-None-Match": eTag} if eTag else None
+
+    # store the conditional request values (ETag and content hash) for a device list processed for the
+    # account, unless the device list state was invalidated since the request was made
+    # Note: stored only once the device list has been processed, so a 304 never refers to a failed parse
+    def _commitDeviceList(self, accountID, generation, eTag, contentHash):
+        with self._deviceListLock:
+            if generation == self._deviceListGeneration:
+                self._deviceListETags[accountID] = eTag
+                if contentHash is None:
+                    self._deviceListHashes.pop(accountID, None)
+                else:
+                    self._deviceListHashes[accountID] = contentHash
+
+    # force the next device list to be retrieved and processed, e.g., after a device action
+    # Note: a retrieval in flight when invalidated is neither shared with later callers nor stored
+    def _invalidateDeviceList(self):
+        with self._deviceListLock:
+            self._deviceListETags.clear()
+            self._deviceListHashes.clear()
+            self._deviceListSnapshot = None
+            self._deviceListGeneration += 1
+
+    # get the snapshot of the device list retrieved within the cache TTL, or None if there is none
+    def _getDeviceListSnapshot(self):
+        snapshot = self._deviceListSnapshot
+        if snapshot is not None and time.monotonic() - snapshot[1] < _DEVICE_LIST_CACHE_TTL:
+            return snapshot[0]
+        return None
+
+    # get the retrieval of the device list in flight that can be shared (single-flight), or start a
+    # new one with the specified function - returns the future for the retrieval and whether it was started
+    def _joinDeviceListFlight(self, startFunc):
+
+        with self._deviceListLock:
+            flight = self._deviceListFlight
+            if flight is not None and flight[1] == self._deviceListGeneration:
+                return flight[0], False
+
+            generation = self._deviceListGeneration
+            future = startFunc()
+            self._deviceListFlight = (future, generation)
+
+        future.add_done_callback(lambda done: self._endDeviceListFlight(done, generation))
+        return future, True
+
+    # end the shared retrieval of the device list and store the snapshot of the retrieved device list
+    def _endDeviceListFlight(self, future, generation):
+
+        with self._deviceListLock:
+            if self._deviceListFlight is not None and self._deviceListFlight[0] is future:
+                self._deviceListFlight = None
+
+            if not future.cancelled() and future.exception() is None and generation == self._deviceListGeneration:
+                devices, changed = future.result()
+                if devices is not None:
+                    self._deviceListSnapshot = (devices, time.monotonic())
+
+    # wait for the rate limiter before a call to an endpoint - returns the seconds to wait, or None
+    # if the call should be skipped
+    # Note: device commands and logins have priority over polls
+    def _reserveCall(self, endpoint, priority):
+
+        wait = self._rateLimiter.reserve(priority)
+        if wait is None:
+            self._metrics.countEvent("rate_limited")
+            self._logger.info("Skipping call to %s - the MyQ service rate limit is exhausted.", endpoint)
+
+        return wait
+
+    # check whether a keep-alive ping may be sent now - pings are skipped while any circuit is open (or
+    # the circuit for the pings is open) and never wait on the rate limiter (lowest priority)
+    def _allowPing(self, endpoint):
+
+        if self._breakers.state() == CIRCUIT_OPEN or not self._breakers.allow(endpoint):
+            self._logger.debug("Skipping %s - the MyQ service circuit is open.", endpoint)
+            return False
+
+        if self._rateLimiter.reserve(False, 0) is None:
+            self._logger.debug("Skipping %s - no calls to spare under the MyQ service rate limit.", endpoint)
+            return False
+
+        return True
+
+    # record a call to an endpoint in the metrics, the circuit breaker for the endpoint, and the rate limiter
+    # Note: network errors and server (5xx) errors count as failures of the endpoint, and 429 responses
+    # (and 503 responses with a Retry-After header) throttle the calls to all endpoints
+    def _recordCall(self, endpoint, secs, status, size, headers=None):
+
+        self._metrics.record(endpoint, secs, status, size)
+        self._breakers.record(endpoint, status is not None and status < 500)
+
+        retryAfter = _getRetryAfter(headers)
+        if status == 429 or (status == 503 and retryAfter is not None):
+            self._metrics.countEvent("throttled")
+            self._rateLimiter.throttle(_RATE_LIMIT_RETRY_AFTER if retryAfter is None else retryAfter)
+        elif status is not None and status < 400:
+            self._rateLimiter.succeed()
+
+    # Request flows - the requests to the MyQ service and the handling of the responses, shared by the
+    # clients. Each flow is a generator that yields each request (a call to the _callAPI() or _oAuthRequest()
+    # transport of the client), is sent back the response, and returns the result of the flow. The clients
+    # run the flows with _runFlow(), blocking on (MyQ) or awaiting (AsyncMyQ) each request.
+
+    # log into the MyQ account and select the accounts (homes) for the home name(s)
+    def _loginFlow(self, userName, password, homeName):
+
+        rc = yield from self._oAuthRetrieveTokenFlow(userName, password)
 
         if rc == LOGIN_SUCCESS:
         
@@ -132,97 +645,53 @@ class MyQ(object):
             self._password = password
 
             # get the account ID and store it for subsequent calls
-            rc = self._getAccountID(homeName)
+            rc = yield from self._getAccountIDFlow(homeName)
         
         return rc
 
-    def getDeviceList(self):
-        """Returns a list of devices in the account
+    # resume the session with the stored oAuth tokens, falling back to a full login
+    def _resumeSessionFlow(self, userName, password, tokenInfo, homeName):
 
-        Returns:
-        list (array) of devices (openers, lights, gateways)
-        """
+        # in case the token expires before being refreshed and we have to retrieve
+        # a new access token
+        self._userName = userName
+        self._password = password
+
+        self._restoreToken(tokenInfo)
+
+        # if the stored access token hasn't expired, then retrieving the account ID
+        # both validates the token and completes the connection
+        if self._tokenTTL > 0:
+            rc = yield from self._getAccountIDFlow(homeName)
+            if rc != LOGIN_ERROR:
+                return rc
+
+        # otherwise try and refresh the access token with the refresh token
+        if self._refreshToken:
+            accessToken = self._accessToken
+            if (yield from self._oAuthRefreshTokenFlow()) and self._accessToken != accessToken:
+                rc = yield from self._getAccountIDFlow(homeName)
+                if rc != LOGIN_ERROR:
+                    return rc
 
-        self._logger.debug("In getDeviceList()...")
+        # if all else fails, go through the full login
+        self._logger.info("Stored oAuth tokens could not be used - logging in to MyQ service.")
+        return (yield from self._loginFlow(userName, password, homeName))
+
+    # retrieve the current properties of a single device in the account
+    def _getDeviceFlow(self, deviceID):
 
         # update the security token if needed    
-        if self._checkToken():
+        if (yield from self._checkTokenFlow()):
 
-            response = self._callAPI(_API_GET_DEVICE_LIST, useSession=True)
+            accountID = self._getDeviceAccountID(deviceID)
+            response = yield functools.partial(self._callAPI, _API_GET_DEVICE_PROPERTIES, deviceID=deviceID, accountID=accountID)
 
             if response is not None:
 
-                deviceInfo = response.json()
-                
-                if response.status_code == 200 and "items" in deviceInfo:
-
-                    deviceList = []
-
-                    for dev in deviceInfo["items"]:
-
-                        # pull out common attributes
-                        deviceID = dev["serial_number"]
-                        deviceType = dev["device_family"]
-                        description = dev.get("name", deviceType + " " + deviceID[-4:])
-
-                        # uncomment the next line to inspect the devices returned from the MyQ service
-                        self._logger.debug("Device Found - Device ID: %s, Device Type: %s, Description: %s", deviceID, deviceType, description)
-
-                        # add device to the list with properties based on type
-                        if deviceType == API_DEVICE_TYPE_GATEWAY:
-
-                            # get gateway attributes
-                            online = dev["state"]["online"]
-                            lastUpdated = dev["state"]["last_status"]
-
-                            # add gateway device to list
-                            deviceList.append({
-                                "type": deviceType,
-                                "id": deviceID,
-                                "description": description,
-                                "online": online,
-                                "last_updated": lastUpdated
-                            })
-
-                        elif deviceType == API_DEVICE_TYPE_OPENER:
-                            
-                            # get the door attributes
-                            parentID = dev["parent_device_id"]                        
-                            state = dev["state"]["door_state"]
-                            lastChanged = dev["state"]["last_update"]
-                            lastUpdated = dev["state"]["last_status"]
-
-                            # add garage door opener device to list
-                            deviceList.append({
-                                "type": deviceType,
-                                "id": deviceID,
-                                "parent_id": parentID,
-                                "description": description,
-                                "state": state,
-                                "last_changed": lastChanged,
-                                "last_updated": lastUpdated
-                            })
-            
-                        elif deviceType == API_DEVICE_TYPE_LAMP:
-
-                            # get the lamp attributes
-                            parentID = dev["parent_device_id"]                        
-                            state = dev["state"]["lamp_state"]              
-                            lastChanged = dev["state"]["last_update"]
-                            lastUpdated = dev["state"]["last_status"]
-
-                            # add lamp device to list
-                            deviceList.append({
-                                "type": deviceType,
-                                "id": deviceID,
-                                "parent_id": parentID,
-                                "description": description,
-                                "state": state,
-                                "last_changed": lastChanged,
-                                "last_updated": lastUpdated
-                        })
-                    
-                    return deviceList
+                if response.status_code == 200:
+
+                    return self._getRegistry(accountID).updateDevice(response.json())
                 
                 elif response.status_code == 401:
                     
@@ -231,7 +700,7 @@ class MyQ(object):
 
                 else:
                     
-                    self._logger.error("Error retrieving device list: %s",  _parseResponseMsg(response))
+                    self._logger.error("Error retrieving device properties for device ID %s: %s", deviceID, _parseResponseMsg(response))
                     return None
 
             else:
@@ -242,69 +711,8 @@ class MyQ(object):
             # Check token failed - wait and see if next call successful
             return None
 
-    def open(self, deviceID):
-        """Opens the specified device (garage door opener)
-
-        Returns:
-        Boolean indicating success of call
-        """
-        
-        return self._performAction(deviceID, _API_DEVICE_ACTION_OPEN)
-
-    def close(self, deviceID):
-        """Closes the specified device (garage door opener)
-
-        Returns:
-        Boolean indicating success of call
-        """
-        
-        return self._performAction(deviceID, _API_DEVICE_ACTION_CLOSE)
-
-    def turnOn(self, deviceID):
-        """Turns on the specified device (light)
-
-        Returns:
-        Boolean indicating success of call
-        """
-
-        return self._performAction(deviceID, _API_DEVICE_ACTION_TURN_ON)
-
-    def turnOff(self, deviceID):
-        """Turns off the specified device (light)
-
-        Returns:
-        Boolean indicating success of call
-        """
-        
-        return self._performAction(deviceID, _API_DEVICE_ACTION_TURN_OFF)
-
-    def disconnect(self):
-        """Closes the HTTP sessions to the MyQ services
-        """
-        self._apiSession.close()
-        self._oAuthSession.close()
-    
-        # Check the access token and refresh if expired
-    def _checkToken(self):
-       
-        currentTime = time.time()
-
-        # If the access token has expired, then we have to retrieve a new one
-        # using the stored user credentials
-        if currentTime - self._lastTokenUpdate > self._tokenTTL:
-            rc = self._oAuthRetrieveToken(self._userName, self._password)
-            return (rc == LOGIN_SUCCESS)
-
-        # If the access token is within 10 minutes of expiring, then refresh
-        # the access token using the oAuth refresh token
-        elif currentTime - self._lastTokenUpdate > self._tokenTTL - 600:
-            return self._oAuthRefreshToken()
-
-        # Otherwise token has not expired so all good
-        return True
-
     # perform the specified action with the specified device
-    def _performAction(self, deviceID, action):
+    def _performActionFlow(self, deviceID, action):
 
         self._logger.debug("In _performAction()...")
 
@@ -318,11 +726,13 @@ class MyQ(object):
             api = _API_GDO_DEVICE_ACTION
 
         # call the MyQ API to perform the action 
-        response = self._callAPI(api, deviceID=deviceID, command=action)
+        response = yield functools.partial(self._callAPI, api, deviceID=deviceID, command=action, accountID=self._getDeviceAccountID(deviceID))
 
         if response is not None:
             
             if response.status_code == 202:
+                # make sure the next poll processes the device list
+                self._invalidateDeviceList()
                 return True
             else:
                 self._logger.error("Error performing device action for device ID %s: %s", deviceID,  _parseResponseMsg(response))
@@ -333,91 +743,151 @@ class MyQ(object):
             return False
 
     # retrieve the account ID for subsequent calls
-    def _getAccountID(self, homeName):
+    def _getAccountIDFlow(self, homeName):
         
         self._logger.debug("In _getAccountID()...")
 
         # retrieve the accounts list from the MyQ service
-        resp = self._callAPI(_API_GET_ACCOUNT_INFO)
+        resp = yield functools.partial(self._callAPI, _API_GET_ACCOUNT_INFO)
         if resp and resp.status_code == 200:
 
-            accounts = resp.json()["accounts"]
-
-            # if a home name was specified, search the accounts for the home name 
-            if homeName is not None:
-                for a in accounts:
-                    if _strip(a.get("name")) == _strip(homeName):
-                        self._accountID = a["id"]
-                        return LOGIN_SUCCESS
-                
-                # if the homename was not found, return bad home name error
-                return LOGIN_BAD_HOME_NAME
-            
-            # otherwise just get the Account ID for the first listed account
-            else:
-                self._accountID = accounts[0]["id"]
-                return LOGIN_SUCCESS
+            # select the account(s) for the home name(s)
+            return self._selectAccounts(resp.json()["accounts"], homeName)
    
         else:
 
             self._logger.error("Error retrieving account ID: %s",  _parseResponseMsg(resp))
             return LOGIN_ERROR        
 
-    # Call the specified REST API
-    def _callAPI(self, api, deviceID="", command="", useSession=False):
-      
-        # if a session is to be used, e.g. device list API calls, then create one if it doesn't already exist
-        if useSession and self._apiSession is None:
-            self._apiSession = requests.Session()
-            self._apiSession.headers.update(_API_SESSION_HEADERS)
+    # poll the device list of the account
+    def _pollAccountDevicesFlow(self, accountID):
 
-        method = api["method"]
-        url = api["url"].format(account_id = self._accountID, device_id = deviceID, command=command)
+        generation = self._deviceListGeneration
+        response = yield functools.partial(self._callAPI, _API_GET_DEVICE_LIST, headers=self._getDeviceListHeaders(accountID), accountID=accountID)
 
-        # make sure the header has the latest access token
-        headers = {"Authorization": self._tokenType + " " + self._accessToken}
+        if response is not None:
+            return self._processDeviceList(response, accountID, generation)
 
+        else:
+            # Error logged in _callAPI function
+            return None, False
 
-        # uncomment the next line to dump HTTP request data to log file for debugging
-        # WARNING: this may expose credentials
-        #self._logger.debug("HTTP %s to %s", method, url)
+    # request the device list of the account and return an iterator of the device records
+    def _iterAccountDevicesFlow(self, accountID):
+
+        generation = self._deviceListGeneration
+        response = yield functools.partial(self._callAPI, _API_GET_DEVICE_LIST, headers=self._getDeviceListHeaders(accountID), stream=True, accountID=accountID)
+
+        if response is not None:
+
+            # if the device list has not changed, iterate the current device records
+            if response.status_code == 304:
+                response.close()
+                return iter(self._getRegistry(accountID).getDevices())
+
+            elif response.status_code == 200:
+                return self._streamDevices(response, accountID, generation)
 
-        try:
-            if useSession:
-                response = self._apiSession.request(
-                    method=method,
-                    url=url,
-                    headers=headers,
-                    timeout=_HTTP_POST_TIMEOUT if method in ("POST", "PUT") else _HTTP_GET_TIMEOUT
-                )
             else:
-                response = requests.request(
-                    method=method,
-                    url=url,
-                    headers=headers,
-                    timeout=_HTTP_POST_TIMEOUT if method in ("POST", "PUT") else _HTTP_GET_TIMEOUT
-                )
-
-            # raise any codes other than 200, 202, and 204 for error handling 
-            if response.status_code not in (200, 202, 204):
-                response.raise_for_status()
+                self._logger.error("Error retrieving device list: %s",  _parseResponseMsg(response))
+                response.close()
+                return None
 
-        # Allow (potentially) temporary network errors to be ignored - log and return None
-        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError, requests.exceptions.HTTPError) as e:
-            self._logger.warning("Network/server error in HTTP %s in _callAPI(): %s", method, str(e))
+        else:
+            # Error logged in _callAPI function
             return None
 
-        # Bail on all other errors
-        except:
-            self._logger.error("Unexpected error occured: %s", sys.exc_info()[0])
-            raise
+    # return an iterator of the device records of the accounts (homes), or None on error, running the
+    # requests with the specified function
+    def _iterDevices(self, runFlow):
 
-        # uncomment the next line to dump HTTP response to log file for debugging
-        #self._logger.debug("HTTP response code: %d data: %s", response.status_code, response.text)
+        # update the security token if needed    
+        if runFlow(self._checkTokenFlow()):
 
-        return response
+            # stream the device lists of multiple accounts (homes) one after another
+            accountIDs = self._getAccountIDs()
+            if len(accountIDs) > 1:
+                return self._chainAccountDevices(accountIDs, runFlow)
+            else:
+                return runFlow(self._iterAccountDevicesFlow(accountIDs[0]))
+
+        else:
+            # Check token failed - wait and see if next call successful
+            return None
+
+    # yield the device records of each of the accounts in turn, skipping accounts that fail to respond
+    def _chainAccountDevices(self, accountIDs, runFlow):
+
+        for accountID in accountIDs:
+            devices = runFlow(self._iterAccountDevicesFlow(accountID))
+            if devices is not None:
+                yield from devices
+
+    # parse the device items from the device list response stream and yield the device records
+    # Note: only the current item (and the unparsed remainder of a chunk) is held in memory
+    def _streamDevices(self, response, accountID, generation):
+
+        registry = self._getRegistry(accountID)
+        devices = []
+
+        try:
+            for dev in _iterJSONItems(response.iter_content(chunk_size=_JSON_STREAM_CHUNK_SIZE), "items"):
+                device = registry.updateDevice(dev)
+                if device is not None:
+                    devices.append(device)
+                    yield device
+
+        # a partial device list is not committed to the registry - log and fail the iteration
+        except (requests.exceptions.RequestException, ValueError) as e:
+            self._logger.warning("Error streaming device list in _streamDevices(): %s", str(e))
+            raise DeviceListStreamError(str(e)) from e
+
+        finally:
+            response.close()
+
+        # the complete device list was received, so update the device list and the conditional request values
+        registry.setDevices(devices)
+        self._commitDeviceList(accountID, generation, response.headers.get("ETag"), None)
+
+    # renew the access token with the refresh token, or by logging in again if the access
+    # token has already expired
+    def _renewTokenFlow(self):
+
+        if time.time() - self._lastTokenUpdate < self._tokenTTL:
+            accessToken = self._accessToken
+            if (yield from self._oAuthRefreshTokenFlow()) and self._accessToken != accessToken:
+                return True
+
+        if time.time() - self._lastTokenUpdate >= self._tokenTTL:
+            return (yield from self._oAuthRetrieveTokenFlow(self._userName, self._password)) == LOGIN_SUCCESS
+
+        return False
+
+    # Check the access token and refresh if expired
+    def _checkTokenFlow(self):
+
+        # if the token is being refreshed in the background, then don't wait on the oAuth service
+        # (if the background refresh has ended, then fall back to renewing the token inline)
+        if self._isTokenRefreshRunning():
+            return True
+       
+        currentTime = time.time()
+
+        # If the access token has expired, then we have to retrieve a new one
+        # using the stored user credentials
+        if currentTime - self._lastTokenUpdate > self._tokenTTL:
+            rc = yield from self._oAuthRetrieveTokenFlow(self._userName, self._password)
+            return (rc == LOGIN_SUCCESS)
+
+        # If the access token is within 10 minutes of expiring, then refresh
+        # the access token using the oAuth refresh token
+        elif currentTime - self._lastTokenUpdate > self._tokenTTL - 600:
+            return (yield from self._oAuthRefreshTokenFlow())
+
+        # Otherwise token has not expired so all good
+        return True
 
-    def _oAuthRetrieveToken(self, userName, password):        
+    def _oAuthRetrieveTokenFlow(self, userName, password):        
 
         self._logger.info("Logging in and retrieving access token via oAuth...")
 
@@ -441,8 +911,9 @@ class MyQ(object):
         }
 
         # call the authorization URL retrieve the MyQ login page
-        respAuth = self._oAuthRequest(
-            url=_OAUTH_AUTHORIZATION_URL,
+        respAuth = yield functools.partial(
+            self._oAuthRequest,
+            url=self._baseURLs["oauth"] + _OAUTH_AUTHORIZATION_PATH,
             headers=headers,
             params=params,  
             allow_redirects=True, # redirects through several pages to get the login page
@@ -459,8 +930,7 @@ class MyQ(object):
         setCookie = respAuth.headers["Set-Cookie"]
 
         # get the verification token input field value from the login form HTML
-        docAuth = PyQuery(respAuth.text)
-        requestVerificationToken = docAuth("input[name='__RequestVerificationToken']").attr("value")
+        requestVerificationToken = _getInputValue(respAuth.text, "__RequestVerificationToken", self._logger)
 
         # verify verification token was retrieved
         if not requestVerificationToken:
@@ -479,7 +949,8 @@ class MyQ(object):
         }
 
         # call the authorization URL retrieve the MyQ login page
-        respLogin = self._oAuthRequest(
+        respLogin = yield functools.partial(
+            self._oAuthRequest,
             url=respAuth.url,
             method="POST",
             data=data,
@@ -509,8 +980,9 @@ class MyQ(object):
         }
 
         # call the authorization URL retrieve the MyQ login page
-        respRedirect = self._oAuthRequest(
-            url=_OAUTH_BASE_URL+redirectURL,
+        respRedirect = yield functools.partial(
+            self._oAuthRequest,
+            url=self._baseURLs["oauth"] + redirectURL,
             method="GET",
             headers=headers,
             allow_redirects=False,
@@ -542,8 +1014,9 @@ class MyQ(object):
         }
 
         # post final challenge and retrieve the tokens
-        respToken = self._oAuthRequest(
-            url=_OAUTH_TOKEN_URL,
+        respToken = yield functools.partial(
+            self._oAuthRequest,
+            url=self._baseURLs["oauth"] + _OAUTH_TOKEN_PATH,
             method="POST",
             data=params,
             headers=headers,
@@ -555,16 +1028,11 @@ class MyQ(object):
             return LOGIN_ERROR
                       
         # Get the token from the response and add it to the session headers
-        tokenInfo = respToken.json()
-        self._accessToken = tokenInfo["access_token"]
-        self._tokenType = tokenInfo["token_type"]
-        self._refreshToken = tokenInfo["refresh_token"]
-        self._tokenTTL = tokenInfo.get("expires_in", _OAUTH_TOKEN_TTL)
-        self._lastTokenUpdate = time.time()
+        self._updateToken(respToken.json())
 
         return LOGIN_SUCCESS   
 
-    def _oAuthRefreshToken(self):
+    def _oAuthRefreshTokenFlow(self):
 
         self._logger.info("Refreshing oAuth access token...")
 
@@ -579,8 +1047,9 @@ class MyQ(object):
         }
 
         # post final challenge and retrieve the tokens
-        respToken = self._oAuthRequest(
-            url=_OAUTH_TOKEN_URL,
+        respToken = yield functools.partial(
+            self._oAuthRequest,
+            url=self._baseURLs["oauth"] + _OAUTH_TOKEN_PATH,
             method="POST",
             data=params,
             headers=headers,
@@ -594,12 +1063,7 @@ class MyQ(object):
         if respToken.status_code == 200:
 
             # Get the token from the response and add it to the session headers
-            tokenInfo = respToken.json()
-            self._accessToken = tokenInfo["access_token"]
-            self._tokenType = tokenInfo["token_type"]
-            self._refreshToken = tokenInfo["refresh_token"]
-            self._tokenTTL = tokenInfo.get("expires_in", _OAUTH_TOKEN_TTL)
-            self._lastTokenUpdate = time.time()
+            self._updateToken(respToken.json(), refreshed=True)
             return True
 
         else:
@@ -610,14 +1074,385 @@ class MyQ(object):
             # let the routine proceed with the current access token
             return True
 
-    def _oAuthRequest(self, url, method="GET", params=None, data=None, headers=None, allow_redirects=False):
-    
-        # create HTTP session for oAuth calls
-        if self._oAuthSession is None:
-            self._oAuthSession = requests.Session()
-            self._oAuthSession.headers.update(_OAUTH_SESSION_HEADERS)
+class MyQ(_MyQBase):
+
+    _apiSessions = None
+    _lastHostUse = None
+    _pollExecutor = None
+    _tokenRefreshThread = None
+    _tokenRefreshStop = None
+
+    # Primary constructor method
+    def __init__(self, logger=_LOGGER, tokenCallback=None, baseURLs=None):
+        super(MyQ, self).__init__(logger, tokenCallback, baseURLs)
+
+        # pooled HTTP sessions (and last use time) for each API host
+        self._apiSessions = {}
+        self._lastHostUse = {}
+        self._tokenRefreshStop = threading.Event()
+
+    def loginToService(self, userName, password, homeName=None):
+        """Logs into the MyQ account and retrieves the acess token via oAuth session
+
+        Parameters:
+        username -- username (email address) for MyQ service (string)
+        password -- password for MyQ service (string)
+        homeName -- specifies a "Home Name", list of home names, or ALL_HOMES for indicating which accounts to use if multiple accounts are present
+
+        Returns:
+        code indicating login success: LOGIN_SUCCESS, LOGIN_BAD_AUTHENTICATION, LOGIN_ERROR
+        """
+        self._logger.debug("in API loginToService()...")
+
+        return self._runFlow(self._loginFlow(userName, password, homeName))
+
+    def resumeSession(self, userName, password, tokenInfo, homeName=None):
+        """Resumes a MyQ session using oAuth tokens persisted from a previous session. If the
+        access token has expired, a refresh of the token is tried before a full login.
+
+        Parameters:
+        username -- username (email address) for MyQ service (string)
+        password -- password for MyQ service (string)
+        tokenInfo -- token values previously returned from getTokenInfo() (dictionary)
+        homeName -- specifies a "Home Name", list of home names, or ALL_HOMES for indicating which accounts to use if multiple accounts are present
+
+        Returns:
+        code indicating login success: LOGIN_SUCCESS, LOGIN_BAD_AUTHENTICATION, LOGIN_ERROR
+        """
+        self._logger.debug("in API resumeSession()...")
+
+        return self._runFlow(self._resumeSessionFlow(userName, password, tokenInfo, homeName))
+
+    def getDeviceList(self):
+        """Returns a list of devices in the account
+
+        Returns:
+        list (array) of device records (openers, lights, gateways)
+        """
+
+        return self.pollDeviceList()[0]
+
+    def pollDeviceList(self):
+        """Returns a list of devices in the account and whether the list changed since the last poll
+
+        Note: concurrent callers share a single call to the MyQ service, and the device list is
+        served to further callers for a couple of seconds (until a device action)
+
+        Returns:
+        tuple of list (array) of device records (None on error) and changed flag (boolean)
+        """
+
+        self._logger.debug("In pollDeviceList()...")
+
+        # serve the device list retrieved within the cache TTL
+        # Note: reported as changed since the caller may not have processed the device list
+        devices = self._getDeviceListSnapshot()
+        if devices is not None:
+            return devices, True
+
+        # wait for the retrieval in flight, if any, otherwise retrieve the device list for all callers
+        future, started = self._joinDeviceListFlight(concurrent.futures.Future)
+        if not started:
+            return future.result()
 
-        # call the specified URL with the specified method and parameters
+        try:
+            future.set_result(self._retrieveDeviceList())
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+
+        return future.result()
+
+    def iterDevices(self):
+        """Returns an iterator of the devices in the account, with each device record parsed and
+        yielded as the device list is received from the MyQ service
+
+        Note: unlike pollDeviceList(), each call retrieves the device list itself (concurrent callers
+        don't share a retrieval and the device list isn't cached), and a changed device list is
+        always iterated in full (the content of the list isn't compared with the last list)
+
+        Returns:
+        iterator (generator) of device records (openers, lights, gateways) or None on error - the
+        iterator raises DeviceListStreamError if the device list stream fails part way
+        """
+
+        self._logger.debug("In iterDevices()...")
+
+        return self._iterDevices(self._runFlow)
+
+    def getDevice(self, deviceID):
+        """Returns the current properties of a single device in the account
+
+        Parameters:
+        deviceID -- serial number of the device to retrieve (string)
+
+        Returns:
+        device record (opener, light, or gateway) or None if the device could not be retrieved
+        """
+
+        self._logger.debug("In getDevice()...")
+
+        return self._runFlow(self._getDeviceFlow(deviceID))
+
+    def open(self, deviceID):
+        """Opens the specified device (garage door opener)
+
+        Returns:
+        Boolean indicating success of call
+        """
+
+        return self._runFlow(self._performActionFlow(deviceID, _API_DEVICE_ACTION_OPEN))
+
+    def close(self, deviceID):
+        """Closes the specified device (garage door opener)
+
+        Returns:
+        Boolean indicating success of call
+        """
+
+        return self._runFlow(self._performActionFlow(deviceID, _API_DEVICE_ACTION_CLOSE))
+
+    def turnOn(self, deviceID):
+        """Turns on the specified device (light)
+
+        Returns:
+        Boolean indicating success of call
+        """
+
+        return self._runFlow(self._performActionFlow(deviceID, _API_DEVICE_ACTION_TURN_ON))
+
+    def turnOff(self, deviceID):
+        """Turns off the specified device (light)
+
+        Returns:
+        Boolean indicating success of call
+        """
+
+        return self._runFlow(self._performActionFlow(deviceID, _API_DEVICE_ACTION_TURN_OFF))
+
+    def warmConnections(self):
+        """Opens (or refreshes) the pooled connections to each of the MyQ API hosts so that
+        the first device command after connecting or an idle period doesn't pay for the TCP
+        and TLS handshakes
+        """
+        self._logger.debug("In warmConnections()...")
+
+        for hostURL, endpoint in self._getPingHosts().items():
+            self._pingHost(hostURL, endpoint)
+
+    def keepAlive(self, maxIdle=_HTTP_KEEPALIVE_IDLE):
+        """Pings the MyQ API hosts whose pooled connections have been idle for more than
+        the specified number of seconds to keep the connections open
+
+        Parameters:
+        maxIdle -- maximum number of seconds a host connection may be idle before being pinged
+        """
+
+        currentTime = time.monotonic()
+        for hostURL, endpoint in self._getPingHosts().items():
+            if currentTime - self._lastHostUse.get(hostURL, 0) > maxIdle:
+                self._pingHost(hostURL, endpoint)
+
+    def startTokenRefresh(self, statusCallback=None):
+        """Starts refreshing the access token on a background thread at a (jittered) time
+        before it expires so that API calls never wait on the oAuth service
+
+        Parameters:
+        statusCallback -- function called with the number of consecutive refresh failures after each refresh
+        """
+        self._tokenRefreshCallback = statusCallback
+
+        if self._tokenRefreshThread is None:
+            self._tokenRefreshThread = threading.Thread(target=self._tokenRefreshLoop, name="MyQTokenRefresh", daemon=True)
+            self._tokenRefreshThread.start()
+
+    def disconnect(self):
+        """Closes the HTTP sessions to the MyQ services
+        """
+        self._tokenRefreshStop.set()
+        if self._pollExecutor is not None:
+            self._pollExecutor.shutdown(wait=False)
+        for session in self._apiSessions.values():
+            session.close()
+        self._apiSessions.clear()
+        if self._oAuthSession is not None:
+            self._oAuthSession.close()
+    
+
+    # background token refresh thread
+    # Note: an unexpected error is counted as a failed refresh (and retried) so the thread keeps running
+    def _tokenRefreshLoop(self):
+        while not self._tokenRefreshStop.wait(self._getTokenRefreshDelay()):
+            try:
+                success = self._runFlow(self._renewTokenFlow())
+            except Exception:
+                self._logger.exception("Unexpected error refreshing the access token in the background.")
+                success = False
+            self._setTokenRefreshResult(success)
+
+    # check whether the access token is being refreshed by the background thread
+    def _isTokenRefreshRunning(self):
+        return self._tokenRefreshThread is not None and self._tokenRefreshThread.is_alive()
+
+    # run the request flow, blocking on each request
+    def _runFlow(self, flow):
+
+        response = None
+        while True:
+            try:
+                request = flow.send(response)
+            except StopIteration as e:
+                return e.value
+            response = request()
+
+    # retrieve the device lists of the accounts (homes) from the MyQ service
+    def _retrieveDeviceList(self):
+
+        # update the security token if needed    
+        if self._runFlow(self._checkTokenFlow()):
+
+            # poll the device lists of multiple accounts (homes) concurrently over the shared sessions
+            accountIDs = self._getAccountIDs()
+            if len(accountIDs) > 1:
+                results = list(self._getPollExecutor().map(lambda accountID: self._runFlow(self._pollAccountDevicesFlow(accountID)), accountIDs))
+            else:
+                results = [self._runFlow(self._pollAccountDevicesFlow(accountIDs[0]))]
+
+            return self._combineDeviceLists(results)
+
+        else:
+            # Check token failed - wait and see if next call successful
+            return None, False
+
+    # get the thread pool for polling the device lists of multiple accounts
+    # Note: limited to the size of the connection pool for the device host
+    def _getPollExecutor(self):
+
+        if self._pollExecutor is None:
+            self._pollExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=_HTTP_POOL_SIZE, thread_name_prefix="MyQPoll")
+
+        return self._pollExecutor
+
+    # get the pooled, keep-alive HTTP session for the host of the specified URL
+    def _getAPISession(self, hostURL):
+
+        session = self._apiSessions.get(hostURL)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(_API_SESSION_HEADERS)
+            session.mount(hostURL, requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=_HTTP_POOL_SIZE))
+            self._apiSessions[hostURL] = session
+
+        self._lastHostUse[hostURL] = time.monotonic()
+        return session
+
+    # send a lightweight request to the host to open or keep alive a pooled connection
+    # Note: the response status is irrelevant - only the connection (and server errors) matter
+    def _pingHost(self, hostURL, endpoint):
+
+        if not self._allowPing(endpoint):
+            return
+
+        start = time.monotonic()
+        try:
+            response = self._getAPISession(hostURL).head(hostURL, timeout=_HTTP_PUT_TIMEOUT)
+            self._recordCall(endpoint, time.monotonic() - start, response.status_code, 0, response.headers)
+        except requests.exceptions.RequestException as e:
+            self._recordCall(endpoint, time.monotonic() - start, None, 0)
+            self._logger.debug("Unable to open connection to %s: %s", hostURL, str(e))
+
+    # Call the specified REST API
+    def _callAPI(self, api, deviceID="", command="", headers=None, stream=False, accountID=None):
+      
+        method = api["method"]
+        url = self._getAPIURL(api).format(account_id = accountID or self._accountID, device_id = deviceID, command=command)
+
+        # fail fast while the circuit for the endpoint is open
+        if not self._breakers.allow(api["name"]):
+            self._logger.info("Skipping HTTP %s in _callAPI() - the MyQ service circuit for %s is open.", method, api["name"])
+            return None
+
+        # wait for the rate limiter (device commands first)
+        wait = self._reserveCall(api["name"], method == "PUT")
+        if wait is None:
+            return None
+        elif wait > 0:
+            time.sleep(wait)
+
+        # get the pooled session for the API host, e.g., the device or GDO action host
+        session = self._getAPISession(_getHostURL(url))
+
+        # make sure the header has the latest access token
+        requestHeaders = {"Authorization": self._authHeader}
+        if headers:
+            requestHeaders.update(headers)
+
+
+        # uncomment the next line to dump HTTP request data to log file for debugging
+        # WARNING: this may expose credentials
+        #self._logger.debug("HTTP %s to %s", method, url)
+
+        response = None
+        start = time.monotonic()
+
+        try:
+            response = session.request(
+                method=method,
+                url=url,
+                headers=requestHeaders,
+                timeout=_HTTP_POST_TIMEOUT if method in ("POST", "PUT") else _HTTP_GET_TIMEOUT,
+                stream=stream
+            )
+
+            # record the call in the metrics (a streamed body hasn't been read yet)
+            self._recordCall(api["name"], time.monotonic() - start, response.status_code, _getResponseSize(response, stream), response.headers)
+
+            # raise any codes other than 200, 202, 204, and 304 for error handling 
+            if response.status_code not in (200, 202, 204, 304):
+                response.raise_for_status()
+
+        # Allow (potentially) temporary network errors to be ignored - log and return None
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError, requests.exceptions.HTTPError) as e:
+            if response is None:
+                self._recordCall(api["name"], time.monotonic() - start, None, 0)
+            self._logger.warning("Network/server error in HTTP %s in _callAPI(): %s", method, str(e))
+            return None
+
+        # Bail on all other errors
+        except:
+            self._logger.error("Unexpected error occured: %s", sys.exc_info()[0])
+            raise
+
+        # uncomment the next line to dump HTTP response to log file for debugging
+        #self._logger.debug("HTTP response code: %d data: %s", response.status_code, response.text)
+
+        return response
+
+    def _oAuthRequest(self, url, method="GET", params=None, data=None, headers=None, allow_redirects=False):
+    
+        # create HTTP session for oAuth calls
+        if self._oAuthSession is None:
+            self._oAuthSession = requests.Session()
+            self._oAuthSession.headers.update(_OAUTH_SESSION_HEADERS)
+
+        endpoint = _getOAuthEndpoint(url)
+        response = None
+
+        # fail fast while the circuit for the endpoint is open
+        if not self._breakers.allow(endpoint):
+            self._logger.warning("Skipping login step %s - the MyQ service circuit is open.", endpoint)
+            return None
+
+        # wait for the rate limiter
+        wait = self._reserveCall(endpoint, True)
+        if wait is None:
+            return None
+        elif wait > 0:
+            time.sleep(wait)
+
+        start = time.monotonic()
+
+        # call the specified URL with the specified method and parameters
         try:
             response = self._oAuthSession.request(
                 url=url,
@@ -628,6 +1463,7 @@ class MyQ(object):
                 allow_redirects=allow_redirects,
                 timeout= _HTTP_OAUTH_TIMEOUT,
             )
+            self._recordCall(endpoint, time.monotonic() - start, response.status_code, len(response.content), response.headers)
             
             # raise any codes other than 200 and 302 for error handling
             if response.status_code not in (200, 302):
@@ -635,6 +1471,8 @@ class MyQ(object):
 
         # Log any temprary network errors - login will be retried
         except (requests.exceptions.Timeout, requests.exceptions.ConnectionError, requests.exceptions.HTTPError) as e:
+            if response is None:
+                self._recordCall(endpoint, time.monotonic() - start, None, 0)
             self._logger.warning("Network/server error logging into MyQ service: %s", str(e))
             return None
 
@@ -645,6 +1483,941 @@ class MyQ(object):
 
         return response
 
+# Asyncio version of the MyQ class - same surface as MyQ (except iterDevices(), see AsyncMyQBridge),
+# but each method is a coroutine and HTTP calls are made through aiohttp so no thread is parked on a socket
+class AsyncMyQ(_MyQBase):
+
+    _tokenRefreshTask = None
+
+    # Primary constructor method
+    def __init__(self, logger=_LOGGER, tokenCallback=None, baseURLs=None):
+
+        if not asyncClientAvailable():
+            raise RuntimeError("The aiohttp package is required for the AsyncMyQ class.")
+
+        super(AsyncMyQ, self).__init__(logger, tokenCallback, baseURLs)
+
+    async def loginToService(self, userName, password, homeName=None):
+        """Logs into the MyQ account and retrieves the acess token via oAuth session
+
+        Parameters:
+        username -- username (email address) for MyQ service (string)
+        password -- password for MyQ service (string)
+        homeName -- specifies a "Home Name", list of home names, or ALL_HOMES for indicating which accounts to use if multiple accounts are present
+
+        Returns:
+        code indicating login success: LOGIN_SUCCESS, LOGIN_BAD_AUTHENTICATION, LOGIN_ERROR
+        """
+        self._logger.debug("in API loginToService()...")
+
+        return await self._runFlow(self._loginFlow(userName, password, homeName))
+
+    async def resumeSession(self, userName, password, tokenInfo, homeName=None):
+        """Resumes a MyQ session using oAuth tokens persisted from a previous session. If the
+        access token has expired, a refresh of the token is tried before a full login.
+
+        Parameters:
+        username -- username (email address) for MyQ service (string)
+        password -- password for MyQ service (string)
+        tokenInfo -- token values previously returned from getTokenInfo() (dictionary)
+        homeName -- specifies a "Home Name", list of home names, or ALL_HOMES for indicating which accounts to use if multiple accounts are present
+
+        Returns:
+        code indicating login success: LOGIN_SUCCESS, LOGIN_BAD_AUTHENTICATION, LOGIN_ERROR
+        """
+        self._logger.debug("in API resumeSession()...")
+
+        return await self._runFlow(self._resumeSessionFlow(userName, password, tokenInfo, homeName))
+
+    async def getDeviceList(self):
+        """Returns a list of devices in the account
+
+        Returns:
+        list (array) of device records (openers, lights, gateways)
+        """
+
+        return (await self.pollDeviceList())[0]
+
+    async def pollDeviceList(self):
+        """Returns a list of devices in the account and whether the list changed since the last poll
+
+        Note: concurrent callers share a single call to the MyQ service, and the device list is
+        served to further callers for a couple of seconds (until a device action)
+
+        Returns:
+        tuple of list (array) of device records (None on error) and changed flag (boolean)
+        """
+
+        self._logger.debug("In pollDeviceList()...")
+
+        # serve the device list retrieved within the cache TTL
+        # Note: reported as changed since the caller may not have processed the device list
+        devices = self._getDeviceListSnapshot()
+        if devices is not None:
+            return devices, True
+
+        # wait for the retrieval in flight, if any, otherwise retrieve the device list for all callers
+        # Note: shielded so that a cancelled caller doesn't cancel the retrieval for the other callers
+        future, started = self._joinDeviceListFlight(lambda: asyncio.ensure_future(self._retrieveDeviceList()))
+        return await asyncio.shield(future)
+
+    async def getDevice(self, deviceID):
+        """Returns the current properties of a single device in the account
+
+        Parameters:
+        deviceID -- serial number of the device to retrieve (string)
+
+        Returns:
+        device record (opener, light, or gateway) or None if the device could not be retrieved
+        """
+
+        self._logger.debug("In getDevice()...")
+
+        return await self._runFlow(self._getDeviceFlow(deviceID))
+
+    async def open(self, deviceID):
+        """Opens the specified device (garage door opener)
+
+        Returns:
+        Boolean indicating success of call
+        """
+
+        return await self._runFlow(self._performActionFlow(deviceID, _API_DEVICE_ACTION_OPEN))
+
+    async def close(self, deviceID):
+        """Closes the specified device (garage door opener)
+
+        Returns:
+        Boolean indicating success of call
+        """
+
+        return await self._runFlow(self._performActionFlow(deviceID, _API_DEVICE_ACTION_CLOSE))
+
+    async def turnOn(self, deviceID):
+        """Turns on the specified device (light)
+
+        Returns:
+        Boolean indicating success of call
+        """
+
+        return await self._runFlow(self._performActionFlow(deviceID, _API_DEVICE_ACTION_TURN_ON))
+
+    async def turnOff(self, deviceID):
+        """Turns off the specified device (light)
+
+        Returns:
+        Boolean indicating success of call
+        """
+
+        return await self._runFlow(self._performActionFlow(deviceID, _API_DEVICE_ACTION_TURN_OFF))
+
+    async def warmConnections(self):
+        """Opens (or refreshes) the pooled connections to each of the MyQ API hosts so that
+        the first device command after connecting or an idle period doesn't pay for the TCP
+        and TLS handshakes
+        """
+        self._logger.debug("In warmConnections()...")
+
+        await asyncio.gather(*[self._pingHost(hostURL, endpoint) for hostURL, endpoint in self._getPingHosts().items()])
+
+    async def keepAlive(self, maxIdle=_HTTP_KEEPALIVE_IDLE):
+        """Pings the MyQ API hosts to keep the pooled connections open
+
+        Parameters:
+        maxIdle -- not used - the aiohttp connector tracks idle connections itself
+        """
+
+        await self.warmConnections()
+
+    async def startTokenRefresh(self, statusCallback=None):
+        """Starts refreshing the access token in a background task at a (jittered) time
+        before it expires so that API calls never wait on the oAuth service
+
+        Parameters:
+        statusCallback -- function called with the number of consecutive refresh failures after each refresh
+        """
+        self._tokenRefreshCallback = statusCallback
+
+        if self._tokenRefreshTask is None:
+            self._tokenRefreshTask = asyncio.ensure_future(self._tokenRefreshLoop())
+
+    async def disconnect(self):
+        """Closes the HTTP sessions to the MyQ services
+        """
+        if self._tokenRefreshTask is not None:
+            self._tokenRefreshTask.cancel()
+        if self._apiSession is not None:
+            await self._apiSession.close()
+        if self._oAuthSession is not None:
+            await self._oAuthSession.close()
+
+    # background token refresh task
+    # Note: an unexpected error is counted as a failed refresh (and retried) so the task keeps running
+    async def _tokenRefreshLoop(self):
+        while True:
+            await asyncio.sleep(self._getTokenRefreshDelay())
+            try:
+                success = await self._runFlow(self._renewTokenFlow())
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._logger.exception("Unexpected error refreshing the access token in the background.")
+                success = False
+            self._setTokenRefreshResult(success)
+
+    # check whether the access token is being refreshed by the background task
+    def _isTokenRefreshRunning(self):
+        return self._tokenRefreshTask is not None and not self._tokenRefreshTask.done()
+
+    # run the request flow, awaiting each request
+    async def _runFlow(self, flow):
+
+        response = None
+        while True:
+            try:
+                request = flow.send(response)
+            except StopIteration as e:
+                return e.value
+            response = await request()
+
+    # retrieve the device lists of the accounts (homes) from the MyQ service
+    async def _retrieveDeviceList(self):
+
+        # update the security token if needed
+        if await self._runFlow(self._checkTokenFlow()):
+
+            # poll the device lists of all of the accounts (homes) concurrently
+            results = await asyncio.gather(*[self._runFlow(self._pollAccountDevicesFlow(accountID)) for accountID in self._getAccountIDs()])
+            return self._combineDeviceLists(results)
+
+        else:
+            # Check token failed - wait and see if next call successful
+            return None, False
+
+    # get the pooled, keep-alive HTTP session for the API hosts
+    # Note: aiohttp sessions must be created from within the running event loop
+    def _getAPISession(self):
+
+        if self._apiSession is None:
+            self._apiSession = aiohttp.ClientSession(
+                headers=_API_SESSION_HEADERS,
+                connector=aiohttp.TCPConnector(limit_per_host=_HTTP_POOL_SIZE, keepalive_timeout=_HTTP_KEEPALIVE_IDLE + _HTTP_GET_TIMEOUT)
+            )
+
+        return self._apiSession
+
+    # send a lightweight request to the host to open or keep alive a pooled connection
+    # Note: the response status is irrelevant - only the connection (and server errors) matter
+    async def _pingHost(self, hostURL, endpoint):
+
+        if not self._allowPing(endpoint):
+            return
+
+        start = time.monotonic()
+        try:
+            async with self._getAPISession().head(hostURL, timeout=aiohttp.ClientTimeout(total=_HTTP_PUT_TIMEOUT)) as response:
+                self._recordCall(endpoint, time.monotonic() - start, response.status, 0, response.headers)
+        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+            self._recordCall(endpoint, time.monotonic() - start, None, 0)
+            self._logger.debug("Unable to open connection to %s: %s", hostURL, str(e))
+
+    # Call the specified REST API
+    async def _callAPI(self, api, deviceID="", command="", headers=None, stream=False, accountID=None):
+
+        method = api["method"]
+        url = self._getAPIURL(api).format(account_id = accountID or self._accountID, device_id = deviceID, command=command)
+
+        # fail fast while the circuit for the endpoint is open
+        if not self._breakers.allow(api["name"]):
+            self._logger.info("Skipping HTTP %s in _callAPI() - the MyQ service circuit for %s is open.", method, api["name"])
+            return None
+
+        # wait for the rate limiter (device commands first)
+        wait = self._reserveCall(api["name"], method == "PUT")
+        if wait is None:
+            return None
+        elif wait > 0:
+            await asyncio.sleep(wait)
+
+        # make sure the header has the latest access token
+        requestHeaders = {"Authorization": self._authHeader}
+        if headers:
+            requestHeaders.update(headers)
+
+        status = None
+        respHeaders = None
+        start = time.monotonic()
+
+        try:
+            resp = await self._getAPISession().request(
+                method=method,
+                url=url,
+                headers=requestHeaders,
+                timeout=aiohttp.ClientTimeout(total=_HTTP_POST_TIMEOUT if method in ("POST", "PUT") else _HTTP_GET_TIMEOUT)
+            )
+
+            # raise any codes other than 200, 202, 204, and 304 for error handling
+            status, respHeaders = resp.status, resp.headers
+            if resp.status not in (200, 202, 204, 304):
+                resp.release()
+                resp.raise_for_status()
+
+            # a streamed body is left to be read as it is iterated
+            if stream:
+                response = _AsyncStreamResponse(resp)
+            else:
+                async with resp:
+                    response = await _AsyncResponse.read(resp)
+
+        # Allow (potentially) temporary network errors to be ignored - log and return None
+        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+            self._recordCall(api["name"], time.monotonic() - start, status, 0, respHeaders)
+            self._logger.warning("Network/server error in HTTP %s in _callAPI(): %s", method, str(e))
+            return None
+
+        self._recordCall(api["name"], time.monotonic() - start, response.status_code, _getResponseSize(response, stream), response.headers)
+
+        return response
+
+    async def _oAuthRequest(self, url, method="GET", params=None, data=None, headers=None, allow_redirects=False):
+
+        # create HTTP session for oAuth calls
+        # Note: the cookie jar has to accept cookies from all hosts in the redirect chain
+        if self._oAuthSession is None:
+            self._oAuthSession = aiohttp.ClientSession(
+                headers=_OAUTH_SESSION_HEADERS,
+                cookie_jar=aiohttp.CookieJar(unsafe=True)
+            )
+
+        endpoint = _getOAuthEndpoint(url)
+        status = None
+
+        # fail fast while the circuit for the endpoint is open
+        if not self._breakers.allow(endpoint):
+            self._logger.warning("Skipping login step %s - the MyQ service circuit is open.", endpoint)
+            return None
+
+        # wait for the rate limiter
+        wait = self._reserveCall(endpoint, True)
+        if wait is None:
+            return None
+        elif wait > 0:
+            await asyncio.sleep(wait)
+
+        respHeaders = None
+        start = time.monotonic()
+
+        # call the specified URL with the specified method and parameters
+        try:
+            async with self._oAuthSession.request(
+                url=url,
+                method=method,
+                params=params,
+                data = data,
+                headers=headers,
+                allow_redirects=allow_redirects,
+                timeout=aiohttp.ClientTimeout(total=_HTTP_OAUTH_TIMEOUT),
+            ) as resp:
+
+                # raise any codes other than 200 and 302 for error handling
+                status, respHeaders = resp.status, resp.headers
+                if resp.status not in (200, 302):
+                    resp.raise_for_status()
+
+                response = await _AsyncResponse.read(resp)
+
+        # Log any temprary network errors - login will be retried
+        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+            self._recordCall(endpoint, time.monotonic() - start, status, 0, respHeaders)
+            self._logger.warning("Network/server error logging into MyQ service: %s", str(e))
+            return None
+
+        self._recordCall(endpoint, time.monotonic() - start, response.status_code, len(response.content), response.headers)
+
+        return response
+
+# Buffered copy of an aiohttp response with the attributes of a requests response that are
+# used by the MyQ API code (status_code, headers, cookies, url, text, json())
+class _AsyncResponse(object):
+
+    __slots__ = ("status_code", "headers", "cookies", "url", "content")
+
+    @classmethod
+    async def read(cls, resp):
+
+        self = cls()
+        self.status_code = resp.status
+        self.cookies = resp.cookies
+        self.url = str(resp.url)
+        self.content = await resp.read()
+
+        # join multiple Set-Cookie headers the same way requests does
+        self.headers = requests.structures.CaseInsensitiveDict(resp.headers)
+        if "Set-Cookie" in resp.headers:
+            self.headers["Set-Cookie"] = ", ".join(resp.headers.getall("Set-Cookie"))
+
+        return self
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+# Unread aiohttp response with the attributes of a streamed requests response that are used by the
+# MyQ API code (status_code, headers, url, iter_content(), close())
+# Note: the body is read through the event loop, so it must be iterated from another thread (AsyncMyQBridge)
+class _AsyncStreamResponse(object):
+
+    __slots__ = ("status_code", "headers", "url", "_resp", "_loop")
+
+    def __init__(self, resp):
+        self.status_code = resp.status
+        self.headers = requests.structures.CaseInsensitiveDict(resp.headers)
+        self.url = str(resp.url)
+        self._resp = resp
+        self._loop = asyncio.get_running_loop()
+
+    # yield the chunks of the body as they are received, raising read errors the way requests does
+    def iter_content(self, chunk_size=1):
+        while True:
+            try:
+                chunk = asyncio.run_coroutine_threadsafe(self._resp.content.read(chunk_size), self._loop).result()
+            except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+                raise requests.exceptions.ChunkedEncodingError(str(e)) from e
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._resp.release)
+
+# Blocking facade for the AsyncMyQ class with the same surface as the MyQ class. Runs
+# an event loop in a background thread and dispatches each call onto the loop
+class AsyncMyQBridge(object):
+
+    _loop = None
+    _thread = None
+    _conn = None
+
+    # Primary constructor method
+    def __init__(self, logger=_LOGGER, tokenCallback=None, baseURLs=None):
+
+        # create the async connection and start the event loop thread
+        self._conn = AsyncMyQ(logger, tokenCallback, baseURLs)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="MyQEventLoop", daemon=True)
+        self._thread.start()
+
+    def loginToService(self, userName, password, homeName=None):
+        return self._run(self._conn.loginToService(userName, password, homeName))
+
+    def resumeSession(self, userName, password, tokenInfo, homeName=None):
+        return self._run(self._conn.resumeSession(userName, password, tokenInfo, homeName))
+
+    def getTokenInfo(self):
+        return self._conn.getTokenInfo()
+
+    def getHomes(self):
+        return self._conn.getHomes()
+
+    def getMetrics(self):
+        return self._conn.getMetrics()
+
+    def getCircuitState(self):
+        return self._conn.getCircuitState()
+
+    def writeMetricsFile(self, path):
+        return self._conn.writeMetricsFile(path)
+
+    def getDeviceList(self):
+        return self._run(self._conn.getDeviceList())
+
+    def pollDeviceList(self):
+        return self._run(self._conn.pollDeviceList())
+
+    # Note: each request of the iteration is run on the event loop, and the device list stream is read
+    # from the event loop as it is iterated
+    def iterDevices(self):
+        return self._conn._iterDevices(self._runFlow)
+
+    def getDevice(self, deviceID):
+        return self._run(self._conn.getDevice(deviceID))
+
+    def warmConnections(self):
+        return self._run(self._conn.warmConnections())
+
+    def startTokenRefresh(self, statusCallback=None):
+        return self._run(self._conn.startTokenRefresh(statusCallback))
+
+    def keepAlive(self, maxIdle=_HTTP_KEEPALIVE_IDLE):
+        return self._run(self._conn.keepAlive(maxIdle))
+
+    def open(self, deviceID):
+        return self._run(self._conn.open(deviceID))
+
+    def close(self, deviceID):
+        return self._run(self._conn.close(deviceID))
+
+    def turnOn(self, deviceID):
+        return self._run(self._conn.turnOn(deviceID))
+
+    def turnOff(self, deviceID):
+        return self._run(self._conn.turnOff(deviceID))
+
+    def disconnect(self):
+        """Closes the HTTP sessions to the MyQ services and stops the event loop
+        """
+        self._run(self._conn.disconnect())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(_HTTP_OAUTH_TIMEOUT)
+
+    # submit the coroutine to the event loop and wait for the result
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    # run the request flow of the async connection on the event loop and wait for the result
+    def _runFlow(self, flow):
+        return self._run(self._conn._runFlow(flow))
+
+# Device records - a single record is kept for each device in the account (in a registry
+# keyed by serial number) and updated in place from each poll of the MyQ service
+class Device(object):
+
+    __slots__ = ("type", "id", "account_id", "description", "last_updated")
+
+    def __init__(self, dev, accountID=""):
+        self.type = dev["device_family"]
+        self.id = dev["serial_number"]
+        self.account_id = accountID
+        self.update(dev)
+
+    # update the record from the device item returned from the MyQ service
+    def update(self, dev):
+        self.description = dev.get("name") or self.type + " " + self.id[-4:]
+        self.last_updated = dev["state"]["last_status"]
+
+class GatewayDevice(Device):
+
+    __slots__ = ("online",)
+
+    def update(self, dev):
+        Device.update(self, dev)
+        self.online = dev["state"]["online"]
+
+class OpenerDevice(Device):
+
+    __slots__ = ("parent_id", "state", "last_changed")
+
+    def update(self, dev):
+        Device.update(self, dev)
+        self.parent_id = dev["parent_device_id"]
+        self.state = dev["state"]["door_state"]
+        self.last_changed = dev["state"]["last_update"]
+
+class LampDevice(Device):
+
+    __slots__ = ("parent_id", "state", "last_changed")
+
+    def update(self, dev):
+        Device.update(self, dev)
+        self.parent_id = dev["parent_device_id"]
+        self.state = dev["state"]["lamp_state"]
+        self.last_changed = dev["state"]["last_update"]
+
+# record classes for the supported device types (device families)
+_DEVICE_CLASSES = {
+    API_DEVICE_TYPE_GATEWAY: GatewayDevice,
+    API_DEVICE_TYPE_OPENER: OpenerDevice,
+    API_DEVICE_TYPE_LAMP: LampDevice
+}
+
+# Registry of the device records for an account
+class _DeviceRegistry(object):
+
+    _accountID = ""
+    _devices = None
+    _deviceList = None
+    _logger = None
+
+    def __init__(self, logger=_LOGGER, accountID=""):
+        self._accountID = accountID
+        self._devices = {}
+        self._deviceList = []
+        self._logger = logger
+
+    # update the registry from the items returned from the device list API and return
+    # the list of device records
+    # Note: the same list is returned from poll to poll unless devices were added or removed
+    def updateDevices(self, items):
+
+        deviceList = self._deviceList
+        listChanged = False
+        i = 0
+
+        for dev in items:
+            device = self.updateDevice(dev)
+            if device is not None:
+                if i >= len(deviceList) or deviceList[i] is not device:
+                    listChanged = True
+                i += 1
+
+        # rebuild the device list (and prune the registry) if devices were added or removed
+        if listChanged or i != len(deviceList):
+            deviceList = [self._devices[dev["serial_number"]] for dev in items if dev["serial_number"] in self._devices and dev["device_family"] in _DEVICE_CLASSES]
+            self._devices = {device.id: device for device in deviceList}
+            self._deviceList = deviceList
+
+        return deviceList
+
+    # return the current list of device records
+    def getDevices(self):
+        return self._deviceList
+
+    # return whether the registry has a record for the device
+    def hasDevice(self, deviceID):
+        return deviceID in self._devices
+
+    # set the device list from device records updated individually (e.g., streamed) and prune the registry
+    def setDevices(self, deviceList):
+
+        if deviceList != self._deviceList:
+            self._devices = {device.id: device for device in deviceList}
+            self._deviceList = deviceList
+
+    # update the registry from a single device item and return the device record
+    # Note: returns None for unsupported device types (e.g. cameras)
+    def updateDevice(self, dev):
+
+        device = self._devices.get(dev["serial_number"])
+
+        if device is not None and device.type == dev["device_family"]:
+            device.update(dev)
+
+        else:
+            deviceClass = _DEVICE_CLASSES.get(dev["device_family"])
+            if deviceClass is None:
+                return None
+
+            device = deviceClass(dev, self._accountID)
+            self._devices[device.id] = device
+
+            # uncomment the next line to inspect the devices returned from the MyQ service
+            self._logger.debug("Device Found - Device ID: %s, Device Type: %s, Description: %s", device.id, device.type, device.description)
+
+        return device
+
+# Circuit breaker state for a single endpoint of the MyQ service
+class _Circuit(object):
+
+    __slots__ = ("state", "failures", "opens", "retryAt")
+
+    def __init__(self):
+        self.state = CIRCUIT_CLOSED
+        self.failures = 0
+        self.opens = 0
+        self.retryAt = 0.0
+
+# Circuit breakers for the endpoints (REST API or oAuth step) of the MyQ service. After
+# consecutive failed calls, the circuit for the endpoint opens and calls fail fast for a jittered,
+# exponentially increasing delay. A single trial call is then let through (half-open) - success
+# closes the circuit and failure re-opens it with a longer delay
+class _CircuitBreakers(object):
+
+    _lock = None
+    _circuits = None
+    _logger = None
+
+    def __init__(self, logger=_LOGGER):
+        self._lock = threading.Lock()
+        self._circuits = {}
+        self._logger = logger
+
+    # check whether a call to the endpoint may be made
+    def allow(self, endpoint):
+
+        with self._lock:
+            circuit = self._circuits.get(endpoint)
+            if circuit is None or circuit.state == CIRCUIT_CLOSED:
+                return True
+
+            # let a single trial call through once the retry delay has passed
+            # Note: a trial call that never completes is given up after the trial timeout
+            now = time.monotonic()
+            if now >= circuit.retryAt:
+                circuit.state = CIRCUIT_HALF_OPEN
+                circuit.retryAt = now + _CIRCUIT_TRIAL_TIMEOUT
+                return True
+
+            return False
+
+    # record the result of a call to the endpoint
+    def record(self, endpoint, success):
+
+        with self._lock:
+            circuit = self._circuits.get(endpoint)
+
+            if success:
+                if circuit is not None and circuit.state != CIRCUIT_CLOSED:
+                    self._logger.info("MyQ service circuit for %s closed.", endpoint)
+                    del self._circuits[endpoint]
+                elif circuit is not None:
+                    circuit.failures = 0
+                return
+
+            if circuit is None:
+                circuit = self._circuits[endpoint] = _Circuit()
+            circuit.failures += 1
+
+            # open (or re-open) the circuit with a jittered, exponentially increasing delay
+            if circuit.state == CIRCUIT_HALF_OPEN or circuit.failures >= _CIRCUIT_FAILURE_THRESHOLD:
+                delay = min(_CIRCUIT_RETRY_DELAY * 2 ** circuit.opens, _CIRCUIT_MAX_RETRY_DELAY)
+                delay = random.uniform(delay / 2, delay)
+                circuit.state = CIRCUIT_OPEN
+                circuit.opens += 1
+                circuit.retryAt = time.monotonic() + delay
+                self._logger.warning("MyQ service circuit for %s opened after %d failed calls - failing fast for %.0f seconds.", endpoint, circuit.failures, delay)
+
+    # get the overall state of the circuits
+    def state(self):
+
+        with self._lock:
+            now = time.monotonic()
+            state = CIRCUIT_CLOSED
+            for circuit in self._circuits.values():
+                if circuit.state == CIRCUIT_OPEN and now < circuit.retryAt:
+                    return CIRCUIT_OPEN
+                elif circuit.state != CIRCUIT_CLOSED:
+                    state = CIRCUIT_HALF_OPEN
+
+            return state
+
+# Token bucket rate limiter shared by all of the calls to the MyQ service. Calls reserve a token
+# and wait until the token is available - device commands and logins may use the whole bucket,
+# while polls leave a reserve for them. When the service throttles the calls, they are paused
+# for the Retry-After period and the rate is cut in half, then raised gradually on successful
+# calls so that it settles at the most the service tolerates
+class _RateLimiter(object):
+
+    _lock = None
+    _rate = 0.0
+    _tokens = 0.0
+    _updated = 0.0
+    _logger = None
+
+    def __init__(self, logger=_LOGGER):
+        self._lock = threading.Lock()
+        self._rate = _RATE_LIMIT_MAX_RATE
+        self._tokens = float(_RATE_LIMIT_BURST)
+        self._updated = time.monotonic()
+        self._logger = logger
+
+    # reserve a token for a call - returns the seconds to wait for the token, or None if the wait
+    # would be longer than the maximum wait
+    # Note: the token is taken when reserved, so the tokens may go negative with calls waiting
+    def reserve(self, priority, maxWait=_RATE_LIMIT_MAX_WAIT):
+
+        with self._lock:
+            self._refill()
+
+            # the time at which the tokens (plus the reserve for priority calls) will be available
+            needed = 1 - self._tokens if priority else 1 + _RATE_LIMIT_COMMAND_RESERVE - self._tokens
+            wait = self._updated + max(needed, 0) / self._rate - time.monotonic()
+            if wait > maxWait:
+                return None
+
+            self._tokens -= 1
+            return max(wait, 0)
+
+    # pause the calls for the specified seconds and cut the rate after a throttling response
+    def throttle(self, retryAfter):
+
+        retryAfter = min(retryAfter, _RATE_LIMIT_MAX_RETRY_AFTER)
+
+        with self._lock:
+            self._refill()
+
+            # cut the rate once for the calls that were in flight together
+            now = time.monotonic()
+            if self._updated <= now:
+                self._rate = max(self._rate / 2, _RATE_LIMIT_MIN_RATE)
+
+            self._tokens = min(self._tokens, 0)
+            self._updated = max(self._updated, now + retryAfter)
+            self._logger.warning("MyQ service throttled the calls - pausing for %.0f seconds at %.2f calls/sec.", retryAfter, self._rate)
+
+    # raise the rate after a successful call
+    def succeed(self):
+
+        with self._lock:
+            if self._rate < _RATE_LIMIT_MAX_RATE:
+                self._refill()
+                self._rate = min(self._rate + _RATE_LIMIT_INCREASE, _RATE_LIMIT_MAX_RATE)
+
+    # add the tokens for the time elapsed since the last update
+    # Note: no tokens are added while the calls are paused (last update in the future)
+    def _refill(self):
+
+        now = time.monotonic()
+        if now > self._updated:
+            self._tokens = min(self._tokens + (now - self._updated) * self._rate, _RATE_LIMIT_BURST)
+            self._updated = now
+
+# Metrics for the calls to a single endpoint of the MyQ service
+class _EndpointMetrics(object):
+
+    __slots__ = ("count", "errors", "bytes", "totalSecs", "statusCounts", "buckets", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.bytes = 0
+        self.totalSecs = 0.0
+        self.statusCounts = Counter()
+        self.buckets = [0] * (len(_METRICS_BUCKETS) + 1)
+        self.samples = deque(maxlen=_METRICS_SAMPLES)
+
+# Latency, status, and error metrics for the calls to each endpoint (REST API or oAuth step)
+# of the MyQ service, and counts of logins and token refreshes
+class _APIMetrics(object):
+
+    _lock = None
+    _endpoints = None
+    _events = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._events = Counter()
+
+    # record a call to an endpoint - status is None if no response was received (e.g., timeout)
+    def record(self, endpoint, secs, status, size):
+
+        failed = status is None or status >= 400
+
+        with self._lock:
+            metrics = self._endpoints.get(endpoint)
+            if metrics is None:
+                metrics = _EndpointMetrics()
+                self._endpoints[endpoint] = metrics
+
+            metrics.count += 1
+            metrics.errors += failed
+            metrics.bytes += size
+            metrics.totalSecs += secs
+            metrics.statusCounts[status or "error"] += 1
+            metrics.buckets[bisect.bisect_left(_METRICS_BUCKETS, secs)] += 1
+            metrics.samples.append((secs, failed))
+
+    # count an event, e.g., a login or token refresh
+    def countEvent(self, event):
+        with self._lock:
+            self._events[event] += 1
+
+    # return a snapshot of the metrics
+    def snapshot(self):
+
+        endpoints = {}
+
+        with self._lock:
+            for endpoint, metrics in self._endpoints.items():
+                latencies = sorted(secs for secs, failed in metrics.samples)
+                endpoints[endpoint] = {
+                    "count": metrics.count,
+                    "errors": metrics.errors,
+                    "bytes": metrics.bytes,
+                    "status": {str(status): count for status, count in metrics.statusCounts.items()},
+                    "last_latency_ms": metrics.samples[-1][0] * 1000,
+                    "latency_ms": {"p{}".format(p): _percentile(latencies, p) * 1000 for p in (50, 95, 99)},
+                    "recent_calls": len(metrics.samples),
+                    "error_rate": sum(failed for secs, failed in metrics.samples) / len(metrics.samples)
+                }
+
+            return {
+                "endpoints": endpoints,
+                "logins": self._events["logins"],
+                "token_refreshes": self._events["token_refreshes"],
+                "throttled": self._events["throttled"],
+                "rate_limited": self._events["rate_limited"]
+            }
+
+    # return the metrics in the Prometheus text exposition format
+    def prometheusText(self):
+
+        calls, errors, sizes, histograms, quantiles = [], [], [], [], []
+
+        with self._lock:
+            for endpoint, metrics in sorted(self._endpoints.items()):
+                label = 'endpoint="{}"'.format(endpoint)
+                for status, count in sorted(metrics.statusCounts.items(), key=lambda item: str(item[0])):
+                    calls.append('myq_api_requests_total{{{},status="{}"}} {}'.format(label, status, count))
+                errors.append("myq_api_errors_total{{{}}} {}".format(label, metrics.errors))
+                sizes.append("myq_api_response_bytes_total{{{}}} {}".format(label, metrics.bytes))
+
+                cumulative = 0
+                for bound, count in zip(_METRICS_BUCKETS + ("+Inf",), metrics.buckets):
+                    cumulative += count
+                    histograms.append('myq_api_request_duration_seconds_bucket{{{},le="{}"}} {}'.format(label, bound, cumulative))
+                histograms.append("myq_api_request_duration_seconds_sum{{{}}} {:.6f}".format(label, metrics.totalSecs))
+                histograms.append("myq_api_request_duration_seconds_count{{{}}} {}".format(label, metrics.count))
+
+                latencies = sorted(secs for secs, failed in metrics.samples)
+                for p in (50, 95, 99):
+                    quantiles.append('myq_api_recent_latency_seconds{{{},quantile="0.{}"}} {:.6f}'.format(label, p, _percentile(latencies, p)))
+
+            events = [
+                "# TYPE myq_oauth_logins_total counter",
+                "myq_oauth_logins_total {}".format(self._events["logins"]),
+                "# TYPE myq_oauth_token_refreshes_total counter",
+                "myq_oauth_token_refreshes_total {}".format(self._events["token_refreshes"]),
+                "# HELP myq_api_throttled_total Responses from the MyQ service throttling the calls (429 or Retry-After)",
+                "# TYPE myq_api_throttled_total counter",
+                "myq_api_throttled_total {}".format(self._events["throttled"]),
+                "# HELP myq_api_rate_limited_total Calls skipped by the client-side rate limiter",
+                "# TYPE myq_api_rate_limited_total counter",
+                "myq_api_rate_limited_total {}".format(self._events["rate_limited"])
+            ]
+
+        lines = ["# HELP myq_api_requests_total Calls to the MyQ service by endpoint and HTTP status", "# TYPE myq_api_requests_total counter"] + calls
+        lines += ["# TYPE myq_api_errors_total counter"] + errors
+        lines += ["# TYPE myq_api_response_bytes_total counter"] + sizes
+        lines += ["# TYPE myq_api_request_duration_seconds histogram"] + histograms
+        lines += ["# HELP myq_api_recent_latency_seconds Latency percentiles of the recent calls to the MyQ service", "# TYPE myq_api_recent_latency_seconds gauge"] + quantiles
+        lines += events
+
+        return "\n".join(lines) + "\n"
+
+# return the specified percentile (nearest rank) of a sorted list of values
+def _percentile(values, p):
+    return values[max(math.ceil(len(values) * p / 100) - 1, 0)] if values else 0.0
+
+# return the size of the body of an HTTP response (from the header for a streamed response)
+def _getResponseSize(response, stream):
+    return int(response.headers.get("Content-Length", 0)) if stream else len(response.content)
+
+# return the seconds from the Retry-After header of an HTTP response (delay seconds or HTTP date), or
+# None if there is no valid header
+def _getRetryAfter(headers):
+
+    value = headers.get("Retry-After") if headers is not None else None
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+# return the name of the oAuth step for the metrics, e.g., "oauth_token" for the token URL
+def _getOAuthEndpoint(url):
+    return "oauth_" + urlsplit(url).path.rstrip("/").rsplit("/", 1)[-1].lower()
+
 # provide a consistent parsing of HTTP response messages for logging
 def _parseResponseMsg(response):
 
@@ -657,6 +2430,107 @@ def _parseResponseMsg(response):
     
     return msg
 
+# Streaming extractor for the value of a named input field in an HTML form. Parsing is
+# stopped as soon as the field is found.
+class _InputValueParser(HTMLParser):
+
+    value = None
+    _name = None
+
+    def __init__(self, name):
+        super(_InputValueParser, self).__init__(convert_charrefs=True)
+        self._name = name
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "input":
+            attrs = dict(attrs)
+            if attrs.get("name") == self._name:
+                self.value = attrs.get("value")
+                raise _InputValueFound()
+
+# raised to stop the input value parser once the field is found
+class _InputValueFound(Exception):
+    pass
+
+# return the value of the named input field in the HTML document
+def _getInputValue(html, name, logger=_LOGGER):
+
+    # skip the markup ahead of the input tag with the field name, unless the tag found may be inside
+    # a script or comment (then the whole document is parsed)
+    # Note: the field name may also appear ahead of the tag, e.g., in a script or another attribute
+    start = 0
+    match = re.search(r"<input\b[^>]*\bname\s*=\s*[\"']?" + re.escape(name) + r"[\"'\s/>]", html, re.IGNORECASE)
+    if match is not None:
+        head = html[:match.start()].lower()
+        if head.rfind("<script") <= head.rfind("</script") and head.rfind("<!--") <= head.rfind("-->"):
+            start = match.start()
+
+    parser = _InputValueParser(name)
+
+    # feed the document to the parser in chunks so that parsing stops soon after the field
+    try:
+        for i in range(start, len(html), _HTML_PARSE_CHUNK_SIZE):
+            parser.feed(html[i:i + _HTML_PARSE_CHUNK_SIZE])
+        parser.close()
+    except _InputValueFound:
+        return parser.value
+
+    logger.debug("Input field %s not found in the HTML document.", name)
+    return None
+
+# incrementally parse the items of the named array in a JSON document read in chunks (bytes)
+# and yield each item as it is completed
+def _iterJSONItems(chunks, key):
+
+    decoder = json.JSONDecoder()
+    textDecoder = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    marker = '"{}"'.format(key)
+    inArray = False
+    buffer = ""
+    pos = 0
+
+    while True:
+
+        # find the start of the array
+        if not inArray:
+            start = buffer.find(marker)
+            start = buffer.find("[", start + len(marker)) if start >= 0 else -1
+            if start >= 0:
+                inArray = True
+                pos = start + 1
+                continue
+
+        # otherwise skip to the next item and try to decode it from the buffered text
+        else:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+
+            if pos < len(buffer):
+                if buffer[pos] == "]":
+                    return
+
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                except ValueError:
+                    pass # item is incomplete - read the next chunk
+                else:
+                    yield item
+                    buffer = buffer[end:]
+                    pos = 0
+                    continue
+
+        # read the next chunk of the document
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise ValueError("Unexpected end of JSON document")
+        buffer += textDecoder.decode(chunk)
+
+# return the scheme and host portion of the URL
+def _getHostURL(url):
+    parts = urlsplit(url)
+    return "{}://{}".format(parts.scheme, parts.netloc)
+
 # return a string stripped of case, puncutation, and spaces
 def _strip(string):
     return ''.join([letter.lower() for letter in ''.join(string) if letter.isalnum()])
\ No newline at end of file